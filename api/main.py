@@ -155,7 +155,7 @@ async def get_top_journalists(
                     {
                         "terms":
                             {
-                                "field": "byline.keyword",
+                                "field": "authors",
                                 "size": 10
                             }
                     }
@@ -440,7 +440,7 @@ async def get_top_writers(
                 {
                     "terms":
                     {
-                        "field": "author.keyword",
+                        "field": "authors",
                         "size": size
                     }
                 }
@@ -472,29 +472,19 @@ async def get_count_by_lists(
         "size": 0,
         "aggs":
             {
-                "ranks_history":
+                "per_list":
+                {
+                    "terms":
                     {
-                        "nested":
-                            {
-                                "path": "ranks_history"
-                            },
-                        "aggs":
-                            {
-                                "per_list":
-                                {
-                                    "terms":
-                                    {
-                                        "field": "ranks_history.list_name.keyword",
-                                        "size": size
-                                    }
-                                }
-                            }
+                        "field": "list_names",
+                        "size": size
                     }
+                }
             }
         }
 
     result = await es.search(index="books", body=query_body)
-    result = json.dumps(result["aggregations"]["ranks_history"]["per_list"]["buckets"])
+    result = json.dumps(result["aggregations"]["per_list"]["buckets"])
 
     return elasticResponse(data=result)
 
@@ -525,18 +515,9 @@ async def get_top_writers_by_list(
                     "filter":
                         [
                             {
-                                "nested":
+                                "term":
                                     {
-                                        "path": "ranks_history",
-                                        "query":
-                                            [
-                                                {
-                                                    "match":
-                                                        {
-                                                            "ranks_history.list_name": list
-                                                        }
-                                                }
-                                            ]
+                                        "list_names": list
                                     }
                             }
                         ]
@@ -549,7 +530,7 @@ async def get_top_writers_by_list(
                 {
                     "terms":
                     {
-                        "field": "author.keyword",
+                        "field": "authors",
                         "size": f"{size}"
                     }
                 }
@@ -661,13 +642,9 @@ async def get_top_reviewers(
                         "filter":
                             [
                                 {
-                                    "range":
+                                    "term":
                                         {
-                                            "publication_date":
-                                                {
-                                                    "gte": f"{year}-01-01",
-                                                    "lte": f"{year}-12-31"
-                                                }
+                                            "published_year": year
                                         }
                                 }
                             ]
@@ -679,7 +656,7 @@ async def get_top_reviewers(
                     {
                         "terms":
                             {
-                                "field": "byline.keyword", "size": 5
+                                "field": "authors", "size": 5
                             }
                     }
             }
@@ -718,7 +695,7 @@ async def get_top_mpaa_ratings(
                                         {
                                             "mpaa_rating":
                                                 [
-                                                    "",
+                                                    "",  # Stored before empty strings were normalized
                                                     "Unrated",
                                                     "Not Rated"
                                                 ]
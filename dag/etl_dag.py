@@ -14,7 +14,7 @@ from airflow import DAG
 SLACK_CONN_ID = 'slack'
 MOUNT_PATH = Variable.get('local_logs')
 NETWORK_ID = Variable.get('network_id')
-API_KEY = Variable.get('api_key')
+API_KEYS = Variable.get('api_keys', default_var=None) or Variable.get('api_key')  # Comma separated NYT API keys
 
 
 def convert_datetime(datetime_string):
@@ -108,7 +108,7 @@ elastic_healthcheck = DockerOperator(
 
 run_etl = DockerOperator(
     image='cedricsoares/ny_times-etl',
-    environment={'API_KEY': API_KEY},
+    environment={'API_KEYS': API_KEYS},
     mounts=[
         Mount(
             source=MOUNT_PATH,
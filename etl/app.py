@@ -1,17 +1,24 @@
 """ ETL to retrieve data from NYT APIs"""
 
 import logging
-from typing import Dict, Any
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from typing import Dict, Any, List
 
 import fire
 import time
 
 from session import Session
 from constants import (MAX_API_CALLS, MAX_BOOKS_MOVIES_CALLS,
-                       RESULTS_BY_PAGE, CONFIGURATIONS)
-from extract import get_books_or_movies, get_news
-from load import create_index
-from utils import delete_duplicates
+                       MAX_NEWS_PAGES_BY_SECTION, RESULTS_BY_PAGE, CONFIGURATIONS,
+                       PIPELINE_QUEUE_SIZE, PIPELINE_LOADER_WORKERS,
+                       NEWS_CONCURRENCY, PLANNER_EXPLORATION_FLOOR)
+from extract import (get_books_lists, get_books_or_movies, get_news, get_news_sections,
+                     replay_archive)
+from extract_async import get_news_async
+from load import bulk_load_settings, create_index, update_mapping, update_number_of_replicas
+from pipeline import Pipeline
+from utils import add_missing_aggregation_fields, delete_duplicates
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO,
@@ -38,11 +45,9 @@ def get_session_configurations(news: bool, books: bool,
                 for running an ETL session
     """
     selected_configurations = {}
+    arguments = {'news': news, 'books': books, 'movies': movies}
 
-    for arg_name, arg_value in locals().items():
-        if arg_name == 'selected_configurations':
-            continue
-
+    for arg_name, arg_value in arguments.items():
         if arg_value:
             selected_configurations[f'{arg_name}'] = CONFIGURATIONS[f'{arg_name}']
 
@@ -51,57 +56,274 @@ def get_session_configurations(news: bool, books: bool,
     return selected_configurations
 
 
-def run(session: Session, selected_configurations: Dict[str, Any]) -> None:
+def plan_api_calls(session: Session, index_names: List[str],
+                   exploration_floor: float) -> Dict[str, Dict[str, int]]:
+    """Split remaining NYT API calls of the day between selected indexes
+
+        Targets are news sections, books and movies. Their share of the
+        remaining calls follows the number of new documents they returned
+        by call during previous runs.
+
+        Args:
+            session (Session): Used ETL session
+            index_names (list): Names of selected indexes
+            exploration_floor (float): Lowest yield used for a target
+
+        Returns:
+            allocations (dict): Number of calls by target for each index,
+                indexes expecting the most new documents first
+    """
+    caps = {}
+
+    if 'news' in index_names:
+        for section in get_news_sections(session=session):
+            caps[f'news/{section}'] = MAX_NEWS_PAGES_BY_SECTION
+
+    for index_name in index_names:
+        if index_name != 'news':
+            caps[index_name] = MAX_BOOKS_MOVIES_CALLS * len(session.api_keys)  # Budget of each key in the pool
+
+    budget = session.get_remaining_api_calls(max_api_calls=MAX_API_CALLS)
+    allocation = session.planner.allocate(caps=caps, budget=budget,
+                                          exploration_floor=exploration_floor)
+
+    allocations = {index_name: {} for index_name in index_names}
+    expected_documents = {index_name: 0.0 for index_name in index_names}
+
+    for target, calls in allocation.items():
+        index_name, _, section = target.partition('/')  # News targets are news/<section>
+        allocations[index_name][section or index_name] = calls
+        expected_documents[index_name] += calls * session.planner.get_yield(target=target)
+
+    for index_name, calls in allocations.items():
+        logger.info(f'----- {sum(calls.values())} NYT API calls planned for {index_name}, '
+                    f'{expected_documents[index_name]:.0f} new documents expected -----')
+
+    return {index_name: allocations[index_name]
+            for index_name in sorted(index_names, key=expected_documents.get, reverse=True)}
+
+
+def deduplicate(session: Session, index_name: str, full_dedup: bool) -> None:
+    """Delete duplicated documents of an index
+
+        Documents ingested since the previous deduplication are compared
+        with older documents. The whole index is searched on the first
+        deduplication or when full_dedup is True.
+
+        Args:
+            session (Session): Used ETL session
+            index_name (str): Name of the deduplicated index
+            full_dedup (bool): If True, the whole index is searched and the
+                hash index rebuilt
+
+        Returns:
+            None
+    """
+    endpoint = f'dedup/{index_name}'
+    started_at = datetime.now(timezone.utc).isoformat()
+    ingested_since = None if full_dedup else session.checkpoints.get(endpoint).get('ingested_at')
+
+    if delete_duplicates(con=session.con, index_name=index_name,
+                         hash_index=session.hash_index, ingested_since=ingested_since):
+        session.checkpoints.save(endpoint, ingested_at=started_at)
+
+
+def backfill_aggregation_fields(session: Session, index_name: str) -> None:
+    """Add aggregation fields to documents stored before they existed
+
+        The backfill runs once by index, it is done again on the next run
+        if it failed.
+
+        Args:
+            session (Session): Used ETL session
+            index_name (str): Name of the backfilled index
+
+        Returns:
+            None
+    """
+    endpoint = f'backfill/{index_name}'
+
+    if session.checkpoints.get(endpoint).get('aggregation_fields'):
+        return
+
+    try:
+        is_done = add_missing_aggregation_fields(con=session.con, index_name=index_name)
+
+    except Exception as e:
+        logger.warning(f"-----Error:{e}-----")
+        return
+
+    if is_done:
+        session.checkpoints.save(endpoint, aggregation_fields=True)
+
+
+def run(session: Session, selected_configurations: Dict[str, Any],
+        concurrent_news: bool = False, replay: bool = False,
+        exploration_floor: float = PLANNER_EXPLORATION_FLOOR,
+        books_mode: str = 'history', dedup: bool = False,
+        full_dedup: bool = False, force_merge: bool = False,
+        bulk_load: bool = False) -> None:
     """Run ETL session on selected configurations
 
         Args:
             selected_configurations (dict): dictionary of configurations to use
                 for running an ETL session
+            concurrent_news (bool): If True, news sections are retrieved
+                concurrently
+            replay (bool): If True, documents are loaded from the archive of
+                raw NYT API responses instead of calling NYT API
+            exploration_floor (float): Lowest yield used to split NYT API
+                calls between targets
+            books_mode (str): history to page through best-sellers history,
+                lists to walk best-sellers lists by publication date
+            dedup (bool): If True, duplicated documents are deleted after
+                the run, among documents ingested since the previous
+                deduplication
+            full_dedup (bool): If True, duplicated documents are searched in
+                the whole index after the run
+            force_merge (bool): If True, indexes are force merged after
+                their bulk load
+            bulk_load (bool): If True, refresh and replicas of indexes are
+                switched off while they are loaded. Always done for replays
+                and force merged loads
 
         Returns:
             None
     """
 
-    for configuration_name, configuration_params in selected_configurations.items():
+    # Pages retrieved by extractors are transformed and saved by the pipeline
+    # stages. Leaving the with block drains the queues and stops the workers
+    with Pipeline(con=session.con, queue_size=PIPELINE_QUEUE_SIZE,
+                  loader_workers=PIPELINE_LOADER_WORKERS) as pipeline:
 
-        logger.info(f'----- Starts runing ETL on {configuration_name} -----')
+        allocations = ({} if replay
+                       else plan_api_calls(session=session,
+                                           index_names=list(selected_configurations),
+                                           exploration_floor=exploration_floor))
 
-        if not session.con.indices.exists(index=configuration_name):  # Check if index exists on Elasticsearch
+        for configuration_name in (allocations or selected_configurations):
 
-            name = configuration_name
-            mapping = configuration_params['mapping']
-            settings = configuration_params['settings']
+            logger.info(f'----- Starts runing ETL on {configuration_name} -----')
+            configuration_params = selected_configurations[configuration_name]
 
-            create_index(con=session.con, name=name, mapping=mapping,
-                         settings=settings)
+            if not session.con.indices.exists(index=configuration_name):  # Check if index exists on Elasticsearch
 
-        if session.is_remaining_api_calls(max_api_calls=MAX_API_CALLS):
+                name = configuration_name
+                mapping = configuration_params['mapping']
+                settings = configuration_params['settings']
 
-            if configuration_name == 'news':
-                get_news(session=session, max_api_calls=MAX_API_CALLS)
+                create_index(con=session.con, name=name, mapping=mapping,
+                             settings=settings)
 
             else:
-                get_books_or_movies(index_name=configuration_name,
-                                    results_by_page=RESULTS_BY_PAGE,
-                                    session=session,
-                                    max_api_calls=MAX_API_CALLS,
-                                    max_books_movies_calls=MAX_BOOKS_MOVIES_CALLS)
+                update_mapping(con=session.con, name=configuration_name,
+                               mapping=configuration_params['mapping'])
+                update_number_of_replicas(con=session.con, name=configuration_name,
+                                          settings=configuration_params['settings'])
+                backfill_aggregation_fields(session=session, index_name=configuration_name)
+
+            # Daily incremental loads keep their replicas, not to copy indexes again
+            load_settings = (bulk_load_settings(con=session.con, name=configuration_name,
+                                                settings=configuration_params['settings'],
+                                                force_merge=force_merge)
+                             if replay or bulk_load or force_merge else nullcontext())
+
+            with load_settings:
+
+                if replay:
+                    replay_archive(session=session, pipeline=pipeline,
+                                   index_name=configuration_name)
+
+                elif session.is_remaining_api_calls(max_api_calls=MAX_API_CALLS):
+
+                    if configuration_name == 'news' and concurrent_news:
+                        get_news_async(session=session, pipeline=pipeline,
+                                       sections_calls=allocations['news'],
+                                       max_api_calls=MAX_API_CALLS,
+                                       concurrency=NEWS_CONCURRENCY)
 
-            delete_duplicates(con=session.con, index_name=configuration_name)
+                    elif configuration_name == 'news':
+                        get_news(session=session, pipeline=pipeline,
+                                 sections_calls=allocations['news'],
+                                 max_api_calls=MAX_API_CALLS)
 
-        logger.info(f'----- ETL finished to run on {configuration_name}  -----')
+                    elif configuration_name == 'books' and books_mode == 'lists':
+                        get_books_lists(session=session, pipeline=pipeline,
+                                        max_api_calls=MAX_API_CALLS,
+                                        max_books_calls=allocations['books']['books'])
 
-    else:
-        logger.warning('----- No more available api_call for the session -----')
+                    else:
+                        get_books_or_movies(index_name=configuration_name,
+                                            results_by_page=RESULTS_BY_PAGE,
+                                            session=session,
+                                            pipeline=pipeline,
+                                            max_api_calls=MAX_API_CALLS,
+                                            max_books_movies_calls=allocations[configuration_name][configuration_name])
+
+                pipeline.flush()  # Pages of the index are saved before its settings are restored
+
+            if dedup or full_dedup:
+                deduplicate(session=session, index_name=configuration_name,
+                            full_dedup=full_dedup)
+
+            logger.info(f'----- ETL finished to run on {configuration_name}  -----')
+
+        else:
+            logger.warning('----- No more available api_call for the session -----')
 
     logger.info('----- ETL run final end -----')
 
 
-if __name__ == '__main__':
+def main(news: bool = False, books: bool = False, movies: bool = False,
+         concurrent_news: bool = False, replay: bool = False,
+         exploration_floor: float = PLANNER_EXPLORATION_FLOOR,
+         books_mode: str = 'history', dedup: bool = False,
+         full_dedup: bool = False, force_merge: bool = False,
+         bulk_load: bool = False) -> None:
+    """Command line entry point of the ETL
+
+        Args:
+            news (bool): If True news are retrieved
+            books (bool): If True books are retrieved
+            movies (bool): If True movies are retrieved
+            concurrent_news (bool): If True, news sections are retrieved
+                concurrently
+            replay (bool): If True, documents are loaded from the archive of
+                raw NYT API responses without any NYT API call
+            exploration_floor (float): Lowest yield, in new documents by
+                call, used to split NYT API calls between targets
+            books_mode (str): history to page through best-sellers history
+                20 books by call, lists to walk best-sellers lists by
+                publication date, all lists of a date by call
+            dedup (bool): If True, duplicated documents are deleted after
+                the run. Documents have stable ids, so only copies stored
+                before ids were stable need it. Only documents ingested since
+                the previous deduplication are checked, the first
+                deduplication of an index searches it whole
+            full_dedup (bool): If True, duplicated documents are searched in
+                the whole index, a rare maintenance operation
+            force_merge (bool): If True, indexes are merged to one segment
+                after their bulk load, for large loads like replays
+            bulk_load (bool): If True, refresh and replicas of indexes are
+                switched off while they are loaded, for large loads like
+                backfills. Replays always load this way
+
+        Returns:
+            None
+    """
     start = time.time()
     session = Session()
-    selected_configurations = fire.Fire(get_session_configurations)
-    run(session=session, selected_configurations=selected_configurations)
+    selected_configurations = get_session_configurations(news=news, books=books,
+                                                         movies=movies)
+    run(session=session, selected_configurations=selected_configurations,
+        concurrent_news=concurrent_news, replay=replay,
+        exploration_floor=exploration_floor, books_mode=books_mode,
+        dedup=dedup, full_dedup=full_dedup, force_merge=force_merge,
+        bulk_load=bulk_load)
     end = time.time()
     runtime = end - start
     logger.info(f'----- ETL took {runtime} seconds to run -----')
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
@@ -0,0 +1,124 @@
+"""Raw NYT API responses archive module"""
+
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(message)s')
+
+
+class ResponseArchive:
+    """Append-only compressed archive of raw NYT API responses
+
+    Responses are appended as independent gzip members to one segment file
+    by UTC day. A SQLite index keeps, for each response, its index name,
+    endpoint, request key, fetch time and position in the segment, so any
+    response can be read back without decompressing a whole segment.
+
+    Attributes:
+        _directory (str): Directory of segment files and index
+        _db (sqlite3.Connection): Connection to the index
+        _lock (threading.Lock): Lock shared by concurrent callers
+    """
+
+    def __init__(self, directory: str):
+        """Init method for ResponseArchive class
+
+        Args:
+            directory (str): Directory of segment files and index
+        """
+        self._directory: str = directory
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, 'index.sqlite'),
+                                   check_same_thread=False)
+        self._db.execute('''CREATE TABLE IF NOT EXISTS responses (
+                                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                index_name TEXT NOT NULL,
+                                endpoint TEXT NOT NULL,
+                                request_key TEXT NOT NULL,
+                                fetched_at TEXT NOT NULL,
+                                segment TEXT NOT NULL,
+                                position INTEGER NOT NULL,
+                                length INTEGER NOT NULL
+                            )''')
+        self._db.execute('''CREATE INDEX IF NOT EXISTS responses_key
+                            ON responses (index_name, request_key, fetched_at)''')
+        self._db.commit()
+
+    def append(self, index_name: str, endpoint: str, request_key: str,
+               content: bytes) -> None:
+        """Append a raw response to the archive
+
+        Args:
+            index_name (str): Name of the Elasticsearch index the response
+                documents belong to
+            endpoint (str): NYT API endpoint path
+            request_key (str): Offset or section used in the request
+            content (bytes): Raw response body
+
+        Returns:
+            None
+        """
+        fetched_at = datetime.now(timezone.utc)
+        segment = f'{fetched_at.date().isoformat()}.gz'
+        member = gzip.compress(content)
+
+        with self._lock:
+            with open(os.path.join(self._directory, segment), 'ab') as segment_file:
+                position = segment_file.tell()
+                segment_file.write(member)
+
+            self._db.execute('''INSERT INTO responses (index_name, endpoint, request_key,
+                                                       fetched_at, segment, position, length)
+                                VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                             (index_name, endpoint, str(request_key),
+                              fetched_at.isoformat(), segment, position, len(member)))
+            self._db.commit()
+
+    def read(self, segment: str, position: int, length: int) -> Dict[str, Any]:
+        """Read one archived response
+
+        Args:
+            segment (str): Segment file name
+            position (int): Position of the response in the segment
+            length (int): Compressed length of the response
+
+        Returns:
+            dict: Decoded response body
+        """
+        with open(os.path.join(self._directory, segment), 'rb') as segment_file:
+            segment_file.seek(position)
+            member = segment_file.read(length)
+
+        return json.loads(gzip.decompress(member))
+
+    def iter_responses(self, index_name: str) -> Iterator[Dict[str, Any]]:
+        """Stream archived responses of an index in fetch order
+
+        Args:
+            index_name (str): Name of the Elasticsearch index
+
+        Yields:
+            dict: Decoded response body
+        """
+        with self._lock:
+            rows = self._db.execute('''SELECT segment, position, length FROM responses
+                                       WHERE index_name = ?
+                                       ORDER BY id''', (index_name,)).fetchall()
+
+        logger.info(f'----- {len(rows)} archived responses found for {index_name} -----')
+
+        for segment, position, length in rows:
+            try:
+                yield self.read(segment=segment, position=position, length=length)
+            except Exception as e:
+                logger.warning(f"-----Error:{e}-----")
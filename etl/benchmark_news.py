@@ -0,0 +1,154 @@
+"""Benchmark sequential and concurrent news extraction
+
+A local stub server plays both the NYT newswire API and the Elasticsearch
+bulk API with configurable latencies, so the wall-clock difference between
+get_news_data() and get_news_data_async() can be measured without using
+any NYT API call.
+
+Usage:
+    python3 benchmark_news.py --sections 20 --api_latency 0.5 --bulk_latency 0.3
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+from urllib.parse import parse_qs, urlparse
+
+import fire
+
+STUB_HOST = '127.0.0.1'
+DOCUMENTS_BY_SECTION = 20
+
+
+def build_stub_handler(sections: int, api_latency: float,
+                       bulk_latency: float) -> type:
+    """Build the request handler class of the stub server
+
+    Args:
+        sections (int): Number of sections returned by section-list.json
+        api_latency (float): Seconds waited before answering a NYT API request
+        bulk_latency (float): Seconds waited before answering a bulk request
+
+    Returns:
+        type: BaseHTTPRequestHandler subclass
+    """
+
+    class StubHandler(BaseHTTPRequestHandler):
+        """Answer NYT newswire and Elasticsearch bulk requests"""
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, body: Dict) -> None:
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.send_header('X-Elastic-Product', 'Elasticsearch')
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            time.sleep(api_latency)
+
+            if 'section-list.json' in self.path:
+                # Section names depend on the api key so that each mode starts
+                # without any section watermark
+                api_key = parse_qs(urlparse(self.path).query)['api-key'][0]
+                results = [{'section': f'{api_key}-section-{i}'} for i in range(sections)]
+            else:
+                section = self.path.split('/content/all/')[1].split('.json')[0]
+                results = [{'section': section, 'title': f'{section} {i}',
+                            'uri': f'nyt://{section}/{i}',
+                            'updated_date': f'2023-07-20T10:{i:02d}:00-04:00',
+                            'abstract': 'abstract ' * 50}
+                           for i in range(DOCUMENTS_BY_SECTION)]
+
+            self.send_json({'status': 'OK', 'num_results': len(results),
+                            'results': results})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            lines = self.rfile.read(length).splitlines()
+            time.sleep(bulk_latency)
+            items = [{'index': {'_id': str(i), 'status': 201}}
+                     for i in range(len(lines) // 2)]
+            self.send_json({'took': 1, 'errors': False, 'items': items})
+
+        do_PUT = do_POST
+
+    return StubHandler
+
+
+def benchmark(sections: int = 20, api_latency: float = 0.5,
+              bulk_latency: float = 0.3, calls_by_minute: int = 600) -> None:
+    """Run news extraction against the stub server in both modes
+
+    Args:
+        sections (int): Number of news sections to retrieve
+        api_latency (float): Seconds waited before answering a NYT API request
+        bulk_latency (float): Seconds waited before answering a bulk request
+        calls_by_minute (int): Per-minute budget given to the rate limiter
+
+    Returns:
+        None
+    """
+    server = ThreadingHTTPServer((STUB_HOST, 0),
+                                 build_stub_handler(sections=sections,
+                                                    api_latency=api_latency,
+                                                    bulk_latency=bulk_latency))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    stub_url = f'http://{STUB_HOST}:{server.server_port}'
+    os.environ['NYT_API_URL'] = f'{stub_url}/svc'
+    os.environ['ES_HOST'] = stub_url
+    os.environ['ETL_STATE_DIR'] = tempfile.mkdtemp()  # Keeps the real quota ledger untouched
+
+    # Imported after the environment is set so that the stub URLs are used
+    from constants import (NEWS_CONCURRENCY, PIPELINE_LOADER_WORKERS, PIPELINE_QUEUE_SIZE,
+                           SECTION_CATALOG_PATH)
+    from extract import get_news_data, get_news_sections
+    from extract_async import get_news_data_async
+    from pipeline import Pipeline
+    from session import Session
+
+    max_api_calls = sections + 1
+    runtimes = {}
+
+    for mode in ('sequential', 'concurrent'):
+        os.environ['API_KEYS'] = mode  # Each mode gets its own ledger entry and sections
+
+        if os.path.exists(SECTION_CATALOG_PATH):  # Sections of the previous mode are not reused
+            os.remove(SECTION_CATALOG_PATH)
+
+        session = Session(calls_by_minute=calls_by_minute,
+                          calls_by_day=max_api_calls)
+        start = time.time()
+        sections_calls = {section: 1 for section in get_news_sections(session=session)}
+
+        with Pipeline(con=session.con, queue_size=PIPELINE_QUEUE_SIZE,
+                      loader_workers=PIPELINE_LOADER_WORKERS) as pipeline:
+            if mode == 'sequential':
+                get_news_data(session=session, pipeline=pipeline,
+                              sections_calls=sections_calls, max_api_calls=max_api_calls)
+            else:
+                get_news_data_async(session=session, pipeline=pipeline,
+                                    sections_calls=sections_calls, max_api_calls=max_api_calls,
+                                    concurrency=NEWS_CONCURRENCY)
+
+        runtimes[mode] = time.time() - start
+
+    server.shutdown()
+
+    for mode, runtime in runtimes.items():
+        print(f'{mode}: {runtime:.2f} seconds for {sections} sections')
+
+    print(f"speedup: {runtimes['sequential'] / runtimes['concurrent']:.2f}x")
+
+
+if __name__ == '__main__':
+    fire.Fire(benchmark)
@@ -0,0 +1,136 @@
+"""Newswire section catalog module"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from checkpoint import CheckpointStore
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(message)s')
+
+
+class SectionCatalog(CheckpointStore):
+    """Persistent catalog of newswire sections
+
+    The section list returned by section-list.json is kept between runs
+    and only refreshed once it is older than the catalog TTL. Each
+    section entry holds:
+        listed_at: Time of the last section list where the section appeared
+        watermark: updated_date and uri of the newest retrieved document
+        resume: Offset where paging carries on and newest document of a
+            run stopped before the watermark, None once it is reached
+        failed: Reason why the section is not requested, if any
+        pages, average_payload_size: Number of retrieved pages and their
+            average size in bytes
+
+    Sections are entries of a CheckpointStore, so CheckpointCommitter can
+    move their watermark forward.
+
+    Attributes:
+        _ttl (timedelta): Maximum age of the section list
+        _failed_sections (dict): Reason by section of sections known to
+            fail, flagged on every refresh
+    """
+
+    def __init__(self, path: str, ttl: timedelta, failed_sections: Dict[str, str]):
+        """Init method for SectionCatalog class
+
+        Args:
+            path (str): Path of the JSON file
+            ttl (timedelta): Maximum age of the section list
+            failed_sections (dict): Reason by section of sections known to fail
+        """
+        super().__init__(path=path)
+        self._ttl: timedelta = ttl
+        self._failed_sections: Dict[str, str] = failed_sections
+
+    def _get_listed_at(self) -> str:
+        """Time of the last section list, lock must be held by the caller"""
+        return max((section.get('listed_at', '') for section in self._checkpoints.values()),
+                   default='')
+
+    def is_expired(self) -> bool:
+        """Check if the section list is older than the catalog TTL"""
+        with self._lock:
+            listed_at = self._get_listed_at()
+
+        if not listed_at:
+            return True
+
+        return datetime.now(timezone.utc) - datetime.fromisoformat(listed_at) > self._ttl
+
+    def refresh(self, sections: List[str]) -> None:
+        """Replace the section list, keeping metadata of known sections
+
+            Failure flags found by previous runs are cleared so that
+            failed sections are tried again, except for sections known to
+            fail.
+
+        Args:
+            sections (list): Section names returned by NYT API
+
+        Returns:
+            None
+        """
+        listed_at = datetime.now(timezone.utc).isoformat()
+
+        with self._lock:
+            for name in sections:
+                section = self._checkpoints.setdefault(name, {})
+                section['listed_at'] = listed_at
+                section.pop('failed', None)
+
+                if name in self._failed_sections:
+                    section['failed'] = self._failed_sections[name]
+
+            self._write()
+
+        logger.info(f'----- Section catalog refreshed with {len(sections)} sections -----')
+
+    def get_sections(self) -> List[str]:
+        """Get sections of the last section list which are not flagged as failed
+
+        Returns:
+            list: Section names
+        """
+        with self._lock:
+            listed_at = self._get_listed_at()
+
+            return [name for name, section in self._checkpoints.items()
+                    if section.get('listed_at') == listed_at and not section.get('failed')]
+
+    def flag_failure(self, section: str, reason: str) -> None:
+        """Stop requesting a section until the next refresh
+
+        Args:
+            section (str): Section name
+            reason (str): Why the section failed
+
+        Returns:
+            None
+        """
+        logger.warning(f'----- Section {section} flagged as failed: {reason} -----')
+        self.save(section, failed=reason)
+
+    def record_pages(self, section: str, pages: int, payload_size: int) -> None:
+        """Update the average payload size of a section
+
+        Args:
+            section (str): Section name
+            pages (int): Number of retrieved pages
+            payload_size (int): Total size in bytes of retrieved pages
+
+        Returns:
+            None
+        """
+        if pages == 0:
+            return
+
+        state = self.get(section)
+        total_pages = state.get('pages', 0) + pages
+        total_size = state.get('average_payload_size', 0) * state.get('pages', 0) + payload_size
+
+        self.save(section, pages=total_pages,
+                  average_payload_size=round(total_size / total_pages))
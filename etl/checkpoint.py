@@ -0,0 +1,155 @@
+"""Checkpoint store module"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(message)s')
+
+
+class CheckpointStore:
+    """Durable per-endpoint extraction state stored in a JSON file
+
+    The file is rewritten atomically (temporary file + rename) on every
+    save, so a crash never leaves a half written checkpoint.
+
+    Attributes:
+        _path (str): Path of the JSON file
+        _checkpoints (dict): Checkpoints by endpoint name
+        _lock (threading.Lock): Lock shared by concurrent callers
+    """
+
+    def __init__(self, path: str):
+        """Init method for CheckpointStore class
+
+        Args:
+            path (str): Path of the JSON file
+        """
+        self._path: str = path
+        self._lock = threading.Lock()
+        self._checkpoints: Dict[str, Dict[str, Any]] = {}
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        try:
+            with open(path, encoding='utf-8') as checkpoints_file:
+                self._checkpoints = json.load(checkpoints_file)
+        except FileNotFoundError:
+            logger.info(f'----- No checkpoint found in {path} -----')
+        except Exception as e:
+            logger.warning(f"-----Error:{e}-----")
+
+    def get(self, endpoint: str) -> Dict[str, Any]:
+        """Get the last saved checkpoint of an endpoint
+
+        Args:
+            endpoint (str): Endpoint name
+
+        Returns:
+            dict: Saved state, empty if the endpoint has no checkpoint
+        """
+        with self._lock:
+            return dict(self._checkpoints.get(endpoint, {}))
+
+    def save(self, endpoint: str, **state: Any) -> None:
+        """Update the checkpoint of an endpoint and write it to disk
+
+        Args:
+            endpoint (str): Endpoint name
+            state: Values to store in the endpoint checkpoint
+
+        Returns:
+            None
+        """
+        with self._lock:
+            checkpoint = self._checkpoints.setdefault(endpoint, {})
+            checkpoint.update(state)
+            checkpoint['updated_at'] = datetime.now(timezone.utc).isoformat()
+            self._write()
+
+    def _write(self) -> None:
+        """Write all checkpoints to disk, lock must be held by the caller"""
+        directory = os.path.dirname(self._path)
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=directory,
+                                                           suffix='.tmp')
+
+        with os.fdopen(file_descriptor, 'w', encoding='utf-8') as temporary_file:
+            json.dump(self._checkpoints, temporary_file, indent=2)
+            temporary_file.flush()
+            os.fsync(temporary_file.fileno())
+
+        os.replace(temporary_path, self._path)
+
+
+class CheckpointCommitter:
+    """Advance an endpoint checkpoint in fetch order once pages are loaded
+
+    Pages may be saved by concurrent loaders in any order. A page state is
+    only written to the store once all pages fetched before it were saved,
+    and the checkpoint stops moving forward after the first lost page.
+
+    Attributes:
+        _store (CheckpointStore): Store where checkpoints are written
+        _endpoint (str): Endpoint name
+        _pending (list): [state, is_saved] of pages waiting for their load
+            result, in fetch order
+        _is_contiguous (bool): False once a page failed to be saved
+        _lock (threading.Lock): Lock shared by loader threads
+    """
+
+    def __init__(self, store: CheckpointStore, endpoint: str):
+        """Init method for CheckpointCommitter class
+
+        Args:
+            store (CheckpointStore): Store where checkpoints are written
+            endpoint (str): Endpoint name
+        """
+        self._store: CheckpointStore = store
+        self._endpoint: str = endpoint
+        self._pending: List[List[Any]] = []
+        self._is_contiguous: bool = True
+        self._lock = threading.Lock()
+
+    def track(self, **state: Any) -> Callable[[bool], None]:
+        """Register a fetched page and get its load callback
+
+        Args:
+            state: Checkpoint values to store once the page is saved
+
+        Returns:
+            callable: Function to call with the page load result
+        """
+        entry = [state, None]
+
+        with self._lock:
+            self._pending.append(entry)
+
+        def on_loaded(is_saved: bool) -> None:
+            with self._lock:
+                entry[1] = is_saved
+                self._commit()
+
+        return on_loaded
+
+    def fail(self) -> None:
+        """Stop the checkpoint from moving forward, a page was lost"""
+        with self._lock:
+            self._pending.append([{}, False])
+            self._commit()
+
+    def _commit(self) -> None:
+        """Write states of pages saved in fetch order"""
+        while self._pending and self._is_contiguous and self._pending[0][1] is not None:
+            state, is_saved = self._pending.pop(0)
+
+            if not is_saved:
+                self._is_contiguous = False
+                break
+
+            self._store.save(self._endpoint, **state)
@@ -0,0 +1,196 @@
+"""NYT API HTTP client module"""
+
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from constants import (NYT_API_URL, HTTP_POOL_SIZE, HTTP_TIMEOUT,
+                       HTTP_MAX_RETRIES, HTTP_BACKOFF, HTTP_RETRY_STATUSES,
+                       HTTP_THROTTLE_STATUSES)
+from ledger import QuotaLedger
+from rate_limiter import BudgetExhaustedError, KeyPool
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(message)s')
+
+
+class ApiRequestError(Exception):
+    """Raised when a NYT API call failed
+
+    Attributes:
+        endpoint (str): Called endpoint path
+        status_code (int): HTTP status of the last attempt. None if it
+            failed without response
+    """
+
+    def __init__(self, endpoint: str, status_code: Optional[int]):
+        super().__init__(f'NYT API call to {endpoint} failed with status {status_code}')
+        self.endpoint: str = endpoint
+        self.status_code: Optional[int] = status_code
+
+
+class NytClient:
+    """Pooled keep-alive HTTP client used for all NYT API calls
+
+    Connections are reused between calls, responses are gzip compressed
+    and each attempt takes a token from the key pool, on the api key
+    allowing the earliest call.
+
+    Attributes:
+        _key_pool (KeyPool): Pool of api keys used to connect to NYT APIs
+        _ledger (QuotaLedger): Persistent ledger where every call is recorded
+        _http (requests.Session): Pooled HTTP session
+        _api_calls (int): Number of calls sent to NYT APIs
+        _lock (threading.Lock): Lock protecting _api_calls
+    """
+
+    def __init__(self, key_pool: KeyPool, ledger: QuotaLedger):
+        """Init method for NytClient class
+
+        Args:
+            key_pool (KeyPool): Pool of api keys used to connect to NYT APIs
+            ledger (QuotaLedger): Persistent ledger where every call is recorded
+        """
+        self._key_pool: KeyPool = key_pool
+        self._ledger: QuotaLedger = ledger
+        self._api_calls: int = 0
+        self._lock = threading.Lock()
+
+        self._http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+        self._http.mount('https://', adapter)
+        self._http.mount('http://', adapter)
+        self._http.headers.update({'Accept': 'application/json',
+                                   'Accept-Encoding': 'gzip, deflate'})
+
+    @property
+    def api_calls(self) -> int:
+        """_api_calls getter"""
+        return self._api_calls
+
+    def get(self, endpoint: str, params: Dict[str, Any]) -> requests.Response:
+        """Send a GET request to a NYT API endpoint
+
+        Each response is classified. Throttled calls (429) lower the pace
+        of the used api key and are retried after Retry-After, connection errors, timeouts
+        and server errors are retried with an exponential backoff with full
+        jitter, other client errors are not retried.
+
+        Args:
+            endpoint (str): Endpoint path relative to NYT_API_URL
+            params (dict): Query parameters, without the api key
+
+        Returns:
+            requests.Response: Successful response
+
+        Raises:
+            BudgetExhaustedError: If the daily NYT API budget is exhausted
+            ApiRequestError: If the call failed after all its attempts or
+                with a non retryable status
+        """
+        url = f'{NYT_API_URL}/{endpoint}'
+        status_code = None
+
+        for attempt in range(HTTP_MAX_RETRIES + 1):
+            api_key = self._key_pool.acquire()
+
+            if api_key is None:
+                raise BudgetExhaustedError('Daily NYT API budget exhausted')
+
+            rate_limiter = self._key_pool.get_limiter(api_key=api_key)
+
+            with self._lock:
+                self._api_calls += 1
+
+            retry_after = None
+
+            try:
+                response = self._http.get(url, params={**params, 'api-key': api_key},
+                                          timeout=HTTP_TIMEOUT)
+                status_code = response.status_code
+                self._ledger.record(api_key=api_key, status_code=status_code)
+                classification = classify_response(status_code=status_code)
+
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._ledger.record(api_key=api_key, status_code=None)
+                logger.warning(f"-----Error:{e}-----")
+                status_code = None
+                classification = 'retryable'
+
+            if classification == 'ok':
+                rate_limiter.record_success()
+                return response
+
+            if classification == 'fatal':
+                raise ApiRequestError(endpoint=endpoint, status_code=status_code)
+
+            logger.warning(f'----- {endpoint} answered {status_code} ({classification}) -----')
+
+            if classification == 'throttled':
+                retry_after = get_retry_after(response=response)
+                rate_limiter.slow_down(retry_after=retry_after)
+
+            if attempt == HTTP_MAX_RETRIES:
+                break
+
+            if retry_after is None:  # Retry-After wait is enforced by the rate limiter
+                backoff = random.uniform(0, HTTP_BACKOFF * 2 ** attempt)
+                logger.info(f'----- Retrying {endpoint} in {backoff:.1f} seconds -----')
+                time.sleep(backoff)
+
+        raise ApiRequestError(endpoint=endpoint, status_code=status_code)
+
+
+def classify_response(status_code: int) -> str:
+    """Classify a NYT API response status
+
+    Args:
+        status_code (int): HTTP status of the response
+
+    Returns:
+        str: ok, throttled, retryable or fatal
+    """
+    if status_code < 400:
+        return 'ok'
+
+    if status_code in HTTP_THROTTLE_STATUSES:
+        return 'throttled'
+
+    if status_code in HTTP_RETRY_STATUSES:
+        return 'retryable'
+
+    return 'fatal'
+
+
+def get_retry_after(response: requests.Response) -> Optional[float]:
+    """Read the number of seconds to wait from Retry-After header
+
+    Args:
+        response (requests.Response): Throttled response
+
+    Returns:
+        float: Seconds to wait, None if the header is missing or invalid
+    """
+    retry_after = response.headers.get('Retry-After')
+
+    if retry_after is None:
+        return None
+
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+
+    try:
+        retry_date = parsedate_to_datetime(retry_after)
+        return max(0.0, (retry_date - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
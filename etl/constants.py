@@ -1,10 +1,110 @@
+import os
+
+NYT_API_URL = os.getenv('NYT_API_URL', 'https://api.nytimes.com/svc')
+STATE_DIR = os.getenv('ETL_STATE_DIR', '/app/logs/state')  # /app/logs is the volume kept between runs
+QUOTA_LEDGER_PATH = os.path.join(STATE_DIR, 'quota_ledger.sqlite')
+CHECKPOINTS_PATH = os.path.join(STATE_DIR, 'checkpoints.json')
+ARCHIVE_DIR = os.path.join(STATE_DIR, 'archive')
+YIELD_STATS_PATH = os.path.join(STATE_DIR, 'yield_stats.json')
+SECTION_CATALOG_PATH = os.path.join(STATE_DIR, 'section_catalog.json')
+HASH_INDEX_PATH = os.path.join(STATE_DIR, 'hash_index.sqlite')
+SECTION_CATALOG_TTL_DAYS = 7  # The newswire section list is refreshed at most weekly
+FAILED_NEWS_SECTIONS = {
+    'multimedia/photos': 'section name causes an error when sending query to NYT Api'
+}
 RESULTS_BY_PAGE = 20
+NEWS_RESULTS_BY_PAGE = 500  # Maximum limit allowed by newswire API
+MAX_NEWS_PAGES_BY_SECTION = 5
 MAX_API_CALLS = 500
+MAX_API_CALLS_BY_MINUTE = 5
+NEWS_CONCURRENCY = 3
 MAX_BOOKS_MOVIES_CALLS = 220
+BOOKS_LISTS = ('full-overview',)  # Encoded list names walked by the books lists mode, full-overview for all lists
+
+PIPELINE_QUEUE_SIZE = 10  # Pages waiting between two pipeline stages
+PIPELINE_LOADER_WORKERS = 2
+PIPELINE_IDLE_FLUSH = 0.5  # Seconds without new page before a loader sends its last chunk
+
+BULK_CHUNK_SIZE = 500  # Maximum of actions by bulk request
+BULK_MAX_CHUNK_BYTES = 10 * 1024 * 1024  # Maximum size of a bulk request
+BULK_THREAD_COUNT = 2  # Bulk requests sent in parallel by each loader
+BULK_MIN_CHUNK_SIZE = 50
+BULK_MAX_CHUNK_SIZE = 5000
+BULK_MAX_THREAD_COUNT = 8
+BULK_TARGET_LATENCY = 1.0  # Seconds by bulk request the chunk size is tuned for
+BULK_DELETE_CHUNK_SIZE = 5000  # Delete actions have no body, so their requests hold more
+BULK_TUNING_CHUNKS = 4  # Chunks by thread sent between two tunings
+BULK_MAX_RETRIES = 3  # Retries of actions rejected by a full Elasticsearch queue
+BULK_INITIAL_BACKOFF = 2  # Seconds before the first retry, doubled at each retry
+
+MGET_BATCH_SIZE = 1000  # Ids by multi get request
+DEDUP_PARTITION_SIZE = 10000  # Fingerprints by terms aggregation request
+DEDUP_GROUP_SIZE = 100  # Copies returned by duplicate group, top_hits limit
+DEDUP_SCROLL_SIZE = 5000  # Documents by scroll page, only their fingerprint fields are retrieved
+SCAN_QUEUE_SIZE = 8  # Scroll pages waiting to be read by a parallel scan
+FINGERPRINT_PATTERN = '[0-9a-f]{16}'  # 64-bit hexadecimal content_fingerprint
+
+# Fields whose values identify copies of a document
+DEDUP_KEYS = {
+    'news': ['section', 'title', 'abstract', 'byline', 'source'],
+    'books': ['title', 'description', 'contributor', 'contributor_note', 'author'],
+    'movies': ['byline', 'display_title', 'mpaa_rating', 'headline'],
+}
+
+HTTP_POOL_SIZE = 10
+HTTP_TIMEOUT = (5, 30)  # Connect and read timeouts in seconds
+HTTP_MAX_RETRIES = 3
+HTTP_BACKOFF = 2
+HTTP_RETRY_STATUSES = (408, 500, 502, 503, 504)
+HTTP_THROTTLE_STATUSES = (429,)
+
+RATE_MIN_PACE = 0.1  # Lowest share of MAX_API_CALLS_BY_MINUTE used when throttled
+RATE_SPEED_UP_STREAK = 10  # Successful calls needed before raising the pace
+RATE_SPEED_UP_STEP = 0.1
+
+PLANNER_PRIOR_YIELD = 20.0  # New documents by call expected from a target never called
+PLANNER_DECAY = 0.3  # Weight of the last run in the learned yields
+PLANNER_EXPLORATION_FLOOR = 0.5  # Lowest yield used to split the budget
+
+# Adds ranks of a book to its ranks_history, ranks already stored for the
+# same list and publication date are skipped. list_names and authors
+# derived fields are kept in line with ranks_history, ingested_at is moved
+# to the current run
+MERGE_RANKS_SCRIPT = """
+if (ctx._source.ranks_history == null) {
+    ctx._source.ranks_history = [];
+}
+if (ctx._source.list_names == null) {
+    ctx._source.list_names = [];
+}
+if (ctx._source.authors == null) {
+    ctx._source.authors = params.authors;
+}
+if (ctx._source.content_fingerprint == null) {
+    ctx._source.content_fingerprint = params.content_fingerprint;
+}
+ctx._source.ingested_at = params.ingested_at;
+for (rank in params.ranks) {
+    boolean is_stored = false;
+    for (stored_rank in ctx._source.ranks_history) {
+        if (stored_rank.list_name == rank.list_name
+                && stored_rank.published_date == rank.published_date) {
+            is_stored = true;
+            break;
+        }
+    }
+    if (!is_stored) {
+        ctx._source.ranks_history.add(rank);
+    }
+    if (rank.list_name != null && !ctx._source.list_names.contains(rank.list_name)) {
+        ctx._source.list_names.add(rank.list_name);
+    }
+}
+"""
 
 INDEX_SETTINGS = {
     "number_of_shards": 2,
-    "number_of_replicas": 2
+    "number_of_replicas": 2  # Limited by the number of data nodes of the cluster
 }
 
 NEWS_MAPPING = {
@@ -18,6 +118,7 @@ NEWS_MAPPING = {
                                             }
                                 }
                         },
+            'authors': {'type': 'keyword'},
             'byline':  {
                             'type': 'text',
                             'analyzer': 'english',
@@ -27,10 +128,12 @@ NEWS_MAPPING = {
                                             }
                                 }
                         },
+            'content_fingerprint': {'type': 'keyword'},
             'created_date': {'type': 'date'},
             'des_facet': {'type': 'keyword'},
             'first_published_date': {'type': 'date'},
             'geo_facet': {'type': 'keyword'},
+            'ingested_at': {'type': 'date'},
             'item_type': {'type': 'keyword'},
             'kicker':  {
                             'type': 'text',
@@ -82,6 +185,7 @@ NEWS_MAPPING = {
             'org_facet': {'type': 'keyword'},
             'per_facet': {'type': 'keyword'},
             'published_date': {'type': 'date'},
+            'published_year': {'type': 'short'},
             'section': {'type': 'keyword'},
             'slug_name': {'type': 'keyword'},
             'source': {
@@ -173,6 +277,8 @@ BOOKS_MAPPING = {
                                     }
                         }
                     },
+        'authors': {'type': 'keyword'},
+        'content_fingerprint': {'type': 'keyword'},
         'contributor_note': {
                             'type': 'text',
                             'analyzer': 'english',
@@ -184,6 +290,7 @@ BOOKS_MAPPING = {
                         },
         'price': {'type': 'float'},
         'age_group': {'type': 'keyword'},
+        'ingested_at': {'type': 'date'},
         'publisher': {
                         'type': 'text',
                         'analyzer': 'english',
@@ -227,11 +334,12 @@ BOOKS_MAPPING = {
                 'published_date': {'type': 'date'},
                 'bestsellers_date': {'type': 'date'},
                 'weeks_on_list': {'type': 'integer'},
-                'ranks_last_week': {'type': 'integer', 'null_value': None},
+                'rank_last_week': {'type': 'long'},  # Name sent by NYT API, long as mapped dynamically
                 'asterisk': {'type': 'integer'},
                 'dagger': {'type': 'integer'},
             }
         },
+        'list_names': {'type': 'keyword'},
         'reviews': {
             'type': 'nested',
             'properties': {
@@ -246,6 +354,7 @@ BOOKS_MAPPING = {
 
 MOVIES_MAPPING = {
     "properties": {
+        "authors": {"type": "keyword"},
         "byline":  {
                         'type': 'text',
                         'analyzer': 'english',
@@ -255,6 +364,7 @@ MOVIES_MAPPING = {
                                         }
                             }
                     },
+        "content_fingerprint": {"type": "keyword"},
         "critics_pick": {"type": "integer"},
         "date_updated": {"type": "date", "format": "yyyy-MM-dd HH:mm:ss"},
         "display_title": {
@@ -290,6 +400,7 @@ MOVIES_MAPPING = {
                 "url": {"type": "text"}
             }
         },
+        "ingested_at": {"type": "date"},
         "mpaa_rating": {"type": "keyword"},
         "multimedia": {
             "properties": {
@@ -309,6 +420,7 @@ MOVIES_MAPPING = {
         },
         "opening_date": {"type": "date", "format": "yyyy-MM-dd"},
         "publication_date": {"type": "date", "format": "yyyy-MM-dd"},
+        "published_year": {"type": "short"},
         "summary_short":  {
                             'type': 'text',
                             'analyzer': 'english',
@@ -2,16 +2,18 @@
 
 
 import logging
-import time
-from typing import List
-
-import requests
-
+from datetime import datetime
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from session import Session
-from utils import build_query, get_endpoint_hits, get_start_offset
-from load import bulk_to_elasticsearch
-from transform import results_to_list
+from checkpoint import CheckpointCommitter
+from client import ApiRequestError
+from constants import BOOKS_LISTS, MAX_NEWS_PAGES_BY_SECTION, NEWS_RESULTS_BY_PAGE
+from pipeline import Pipeline
+from rate_limiter import BudgetExhaustedError
+from transform import lists_to_books, ranked_books_to_actions
+from utils import build_query, get_books_ids_by_isbn, get_start_offset
 
 
 logger = logging.getLogger(__name__)
@@ -19,56 +21,66 @@ logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(message)s')
 
 
-def get_news(session: Session, max_api_calls: int) -> None:
+def get_news(session: Session, pipeline: Pipeline, sections_calls: Dict[str, int],
+             max_api_calls: int) -> None:
     """Run entire process to get news data from NYT API
 
-            It runs get_news_sections() to get section and get_news_data()
-            if it remains any NYT API calls in the ETL Session
+            It runs get_news_data() if it remains any NYT API calls in the
+            ETL Session
 
     Args:
         session (Session): Used ETL session
+        pipeline (Pipeline): Pipeline where retrieved documents are submitted
+        sections_calls (dict): Number of calls allowed by news section
         max_api_calls (int): Maximum of dailly calls allowed by the NYT API
 
     Returns:
         None
     """
-    sections = get_news_sections(session=session)
-
     if (session.is_remaining_api_calls(max_api_calls=max_api_calls)):
-        get_news_data(session=session, sections=sections, max_api_calls=max_api_calls)
+        get_news_data(session=session, pipeline=pipeline, sections_calls=sections_calls,
+                      max_api_calls=max_api_calls)
 
 
 def get_news_sections(session: Session) -> List[str]:
-    """ Get list of news section from NYT API
+    """ Get list of news section from the section catalog
+
+        The catalog is refreshed from NYT API once it is expired. If the
+        refresh fails, the expired section list is used.
 
     Args:
         session (Session): Used ETL session
 
     Returns:
-        sections (list): List of news sections retrieved from NYT API
+        sections (list): List of news sections which are not flagged as failed
     """
 
-    logger.info('----- Retrieving news sections -----')
-    query = build_query(index_name='news_sections', api_key=session.api_key)
+    if session.catalog.is_expired():
+        logger.info('----- Retrieving news sections -----')
+        endpoint, params = build_query(index_name='news_sections')
 
-    try:
-        results = requests.get(query)
-        sections = [item['section'] for item in results.json()['results']]
-        session.api_calls += 1
-        logger.info(f'----- Total number of NYT API calls: {session.api_calls} -----')
+        try:
+            results = session.client.get(endpoint=endpoint, params=params)
+            session.catalog.refresh(sections=[item['section'] for item in results.json()['results']])
+            logger.info(f'----- Total number of NYT API calls: {session.api_calls} -----')
 
-        return sections
+        except Exception as e:
+            logger.warning(f"-----Error:{e}-----")
 
-    except Exception as e:
-        logger.warning(f"-----Error:{e}-----")
+    return session.catalog.get_sections()
 
 
-def get_news_data(session: Session, sections: List[str], max_api_calls: int) -> None:
+def get_news_data(session: Session, pipeline: Pipeline, sections_calls: Dict[str, int],
+                  max_api_calls: int) -> None:
     """Get news documents from NYT newswire API
 
+        Sections with the most allowed calls are retrieved first, sections
+        without allowed calls are skipped.
+
     Args:
         session (Session): Used ETL session
-        sections (list): List of news sections
+        pipeline (Pipeline): Pipeline where retrieved documents are submitted
+        sections_calls (dict): Number of calls allowed by news section
         max_api_calls (int): Maximum of dailly calls allowed by the NYT API
 
     Returns:
@@ -77,51 +89,197 @@ def get_news_data(session: Session, sections: List[str], max_api_calls: int) ->
 
     logger.info('----- Start geting news data from NYT API -----')
 
-    for section in sections:
-        if section == 'multimedia/photos': # multimedia/photos section name causes an error when sending query to NYT Api
-            continue
+    for section, max_pages in sort_sections_calls(sections_calls=sections_calls):
         if session.is_remaining_api_calls(max_api_calls=max_api_calls):
-            logger.info(f'----- Start retriving data from section: {section} -----')
+            try:
+                get_news_section_data(session=session, pipeline=pipeline,
+                                      section=section, max_api_calls=max_api_calls,
+                                      max_pages=max_pages)
 
-            query = build_query(index_name='news', news_section=section,
-                                api_key=session.api_key)
+            except BudgetExhaustedError as e:
+                logger.warning(f"-----Error:{e}-----")
+                break
 
-            try:
-                content = requests.get(query)
-                # save into the ES DB
-                res = content.json()
 
-                docs = res['results']
+def sort_sections_calls(sections_calls: Dict[str, int]) -> List[Tuple[str, int]]:
+    """Sort news sections by decreasing number of allowed calls
 
-                # Prepare the documents for bulk indexing
-                actions = results_to_list(index_name='news', results=docs)
+    Args:
+        sections_calls (dict): Number of calls allowed by news section
 
-                bulk_to_elasticsearch(con=session.con, bulk_list=actions)
+    Returns:
+        list: (section, allowed calls) of sections with allowed calls
+    """
+    return sorted(((section, calls) for section, calls in sections_calls.items() if calls > 0),
+                  key=lambda section_calls: section_calls[1], reverse=True)
 
-            except Exception as e:
-                logger.warning(f"-----Error:{e}-----")
 
-            session.api_calls += 1
-            logger.info(f'----- Total number of NYT API calls: {session.api_calls} -----')
+def is_newer_than_watermark(doc: Dict[str, Any],
+                            watermark: Optional[Dict[str, str]]) -> bool:
+    """Check if a newswire document was updated after a section watermark
 
-            ######################################################
-            time.sleep(12)  ##### TO MODIFY ACCORDING API ALLOWANCE
-            #################### 5 requests max per minute ######
-            ######################################################
+    Args:
+        doc (dict): Newswire document
+        watermark (dict): updated_date and uri of the newest document
+            already retrieved from the section. None if there is none
+
+    Returns:
+        bool: True if the document is not retrieved yet
+    """
+    if not watermark:
+        return True
+
+    updated_date = datetime.fromisoformat(doc['updated_date'])
+    watermark_date = datetime.fromisoformat(watermark['updated_date'])
+
+    if updated_date == watermark_date:
+        return doc.get('uri') != watermark['uri']
+
+    return updated_date > watermark_date
+
+
+def get_news_section_data(session: Session, pipeline: Pipeline, section: str,
+                          max_api_calls: int,
+                          max_pages: int = MAX_NEWS_PAGES_BY_SECTION) -> None:
+    """Page through a newswire section until its watermark
+
+        Pages of NEWS_RESULTS_BY_PAGE documents are retrieved, newest first,
+        until a document already retrieved by a previous run is reached, the
+        section has no more results or max_pages pages were retrieved. The
+        section watermark is moved to the newest document once the
+        watermark or the end of the section is reached and all retrieved
+        pages are saved in the section catalog. A run stopped before, by
+        max_pages or the budget, saves a resume offset and the next run
+        carries on from it: newer documents only push older ones to higher
+        offsets, so no document is skipped. Calls and new documents are
+        recorded in the quota planner. A section answering with a client
+        error is flagged as failed in the catalog.
+
+    Args:
+        session (Session): Used ETL session
+        pipeline (Pipeline): Pipeline where retrieved documents are submitted
+        section (str): Name of the news section
+        max_api_calls (int): Maximum of dailly calls allowed by the NYT API
+        max_pages (int): Maximum of pages to retrieve
+
+    Returns:
+        None
+
+    Raises:
+        BudgetExhaustedError: If the daily NYT API budget is exhausted
+    """
+    logger.info(f'----- Start retriving data from section: {section} -----')
+
+    entry = session.catalog.get(section)
+    watermark = (entry.get('watermark')
+                 or session.checkpoints.get(f'news/{section}').get('watermark'))  # Saved before the section catalog
+    committer = CheckpointCommitter(store=session.catalog, endpoint=section)
+    resume = entry.get('resume')
+
+    if resume:
+        newest_doc = resume['newest']
+        start_offset = resume['offset']
+        logger.info(f'----- Resuming section: {section} from offset: {start_offset} -----')
+    else:
+        newest_doc = None
+        start_offset = 0
+
+    api_calls = 0  # Concurrent fetchers share session.api_calls
+    new_documents = 0
+    payload_size = 0
+    budget_error = None
+
+    for page in range(max_pages):
+        if not session.is_remaining_api_calls(max_api_calls=max_api_calls):
+            break
+
+        endpoint, params = build_query(index_name='news', news_section=section,
+                                       start_offset=start_offset)
+
+        try:
+            content = session.client.get(endpoint=endpoint, params=params)
+            session.archive.append(index_name='news', endpoint=endpoint,
+                                   request_key=f'{section}/{start_offset}',
+                                   content=content.content)
+
+            api_calls += 1
+            payload_size += len(content.content)
+            docs = content.json()['results'] or []
+            new_docs = [doc for doc in docs if is_newer_than_watermark(doc=doc, watermark=watermark)]
+
+            if newest_doc is None and docs:
+                newest_doc = max(docs, key=lambda doc: datetime.fromisoformat(doc['updated_date']))
+
+        except BudgetExhaustedError as e:
+            budget_error = e
+            break
+
+        except ApiRequestError as e:
+            logger.warning(f"-----Error:{e}-----")
+            committer.fail()
+
+            if e.status_code in (400, 404):
+                session.catalog.flag_failure(section=section, reason=str(e))
+            break
+
+        except Exception as e:
+            logger.warning(f"-----Error:{e}-----")
+            committer.fail()
+            break
+
+        is_caught_up = (len(new_docs) < len(docs)  # Watermark reached
+                        or len(docs) < NEWS_RESULTS_BY_PAGE)
+        is_last_page = is_caught_up or page == max_pages - 1
+
+        if newest_doc is None:
+            state = {}
+        elif is_caught_up:
+            state = {'watermark': {'updated_date': newest_doc['updated_date'],
+                                   'uri': newest_doc.get('uri')},
+                     'resume': None}
+        else:
+            state = {'resume': {'offset': start_offset + NEWS_RESULTS_BY_PAGE,
+                                'newest': {'updated_date': newest_doc['updated_date'],
+                                           'uri': newest_doc.get('uri')}}}
+
+        logger.info(f'----- {len(new_docs)} new documents at offset {start_offset} of section: {section} -----')
+        new_documents += len(new_docs)
+        pipeline.submit(index_name='news', docs=new_docs,
+                        on_loaded=committer.track(**state))
+
+        if is_last_page:
+            break
+
+        start_offset += NEWS_RESULTS_BY_PAGE
+
+    session.planner.record(target=f'news/{section}', calls=api_calls,
+                           documents=new_documents)
+    session.catalog.record_pages(section=section, pages=api_calls,
+                                 payload_size=payload_size)
+    logger.info(f'----- Total number of NYT API calls: {session.api_calls} -----')
+
+    if budget_error is not None:
+        raise budget_error
 
 
 def get_books_or_movies(index_name: str,
-                        results_by_page: int, session: Session,
+                        results_by_page: int, session: Session, pipeline: Pipeline,
                         max_api_calls: int,
                         max_books_movies_calls: int) -> None:
     """Get books or movies documents from books API
         For both logic is the same due to API calls limites
 
+        Paging stops as soon as the API reports that there is no more
+        results: books hits come from num_results of each page and movies
+        from has_more flag. Calls and retrieved documents are recorded in
+        the quota planner.
+
     Args:
         index_name (str): Name of the Elasticsearch index where documents
             are added
         results_by_page (int): Number of results of each reponse from NYT API calls
         session (Session): Used ETL session
+        pipeline (Pipeline): Pipeline where retrieved documents are submitted
         max_api_calls (int): Maximum of dailly calls allowed by the NYT API
         max_books_movies_calls (int) : Number of allowed calls for books or movies
 
@@ -130,50 +288,284 @@ def get_books_or_movies(index_name: str,
     """
     logger.info(f'----- Start getting {index_name} from NYT API -----')
 
+    api_calls_at_start = session.api_calls
     internal_api_calls = 0
+    retrieved_documents = 0
 
     logger.info(f'----- Number of NYT API calls {session.api_calls} -----')
 
-    endpoint_hits = get_endpoint_hits(con=session.con, api_key=session.api_key,
-                                      index_name=index_name)
+    checkpoint = session.checkpoints.get(index_name)
 
-    internal_api_calls += 1  # A first API call is used to get endpoint_hits
+    if 'offset' in checkpoint:
+        start_offset = checkpoint['offset']
+        logger.info(f'----- Resuming {index_name} from checkpoint offset: {start_offset} -----')
+    else:
+        start_offset = get_start_offset(con=session.con, index_name=index_name)
 
-    start_offset = get_start_offset(con=session.con, index_name=index_name)
+    committer = CheckpointCommitter(store=session.checkpoints, endpoint=index_name)
 
     while ((session.is_remaining_api_calls(max_api_calls=max_api_calls))
-           and (internal_api_calls <= max_books_movies_calls)):
+           and (internal_api_calls < max_books_movies_calls)):
 
         logger.info(f'----- Total number of NYT API calls: {session.api_calls} -----')
         logger.info(f'----- Number of NYT Api calls for {index_name}: {internal_api_calls} -----')
         logger.info(f'----- query starts at offset: {start_offset} -----')
 
-        query = build_query(index_name=index_name, api_key=session._api_key,
-                            start_offset=start_offset)
+        endpoint, params = build_query(index_name=index_name,
+                                       start_offset=start_offset)
 
         try:
-            content = requests.get(query)
+            content = session.client.get(endpoint=endpoint, params=params)
+            session.archive.append(index_name=index_name, endpoint=endpoint,
+                                   request_key=start_offset, content=content.content)
+
             res = content.json()
-            endpoint_hits = res['num_results']
+            endpoint_hits = res.get('num_results')
             docs = res['results']
             saved_documents_request = len(docs)
-            actions = results_to_list(index_name=index_name, results=docs)
             saved_documents = start_offset + saved_documents_request
-            bulk_to_elasticsearch(con=session.con, bulk_list=actions)
+
+            if 'has_more' in res:
+                has_more = res['has_more'] and saved_documents_request > 0  # NY Times movies API does not return endpoints_hits
+            else:
+                has_more = saved_documents < endpoint_hits
+
+            # NYT API offsets must be multiples of results_by_page: a partial
+            # page is fetched again next time to get its newly added results
+            next_offset = (start_offset + results_by_page
+                           if saved_documents_request == results_by_page else start_offset)
+
+            # Checkpoint is written once the page is saved in Elasticsearch
+            on_loaded = committer.track(offset=next_offset, endpoint_hits=endpoint_hits,
+                                        has_more=has_more)
+            pipeline.submit(index_name=index_name, docs=docs, on_loaded=on_loaded)
+            retrieved_documents += saved_documents_request
 
             if index_name == 'books':
                 logger.info(f'----- Remaining documents to save regarding endpoints hits: {endpoint_hits - saved_documents} -----')  # NY Times movies API does not return endpoints_hits
 
+            if not has_more:
+                logger.info(f'----- No more {index_name} to retrieve from NYT API -----')
+                break
+
+        except BudgetExhaustedError as e:
+            logger.warning(f"-----Error:{e}-----")
+            break
+
         except Exception as e:
+            # The failed offset is never skipped: paging stops here and the
+            # next run resumes from the checkpoint
             logger.warning(f"-----Error:{e}-----")
+            committer.fail()
+            break
 
         start_offset += results_by_page
 
-        session.api_calls += 1
-        internal_api_calls += 1
+        internal_api_calls = session.api_calls - api_calls_at_start
+
+    session.planner.record(target=index_name, calls=session.api_calls - api_calls_at_start,
+                           documents=retrieved_documents)
+    pipeline.flush()
+    logger.info(f"----- Next offset to use on API call: {session.checkpoints.get(index_name).get('offset')} -----")
+
+
+def get_books_lists(session: Session, pipeline: Pipeline, max_api_calls: int,
+                    max_books_calls: int) -> None:
+    """Get books rankings from best-sellers lists endpoints
+
+        Each call returns every book ranked on a list, or on all lists with
+        full-overview, for one publication date. The calls are split
+        between the lists of BOOKS_LISTS. Calls and retrieved books are
+        recorded in the quota planner.
+
+    Args:
+        session (Session): Used ETL session
+        pipeline (Pipeline): Pipeline where retrieved documents are submitted
+        max_api_calls (int): Maximum of dailly calls allowed by the NYT API
+        max_books_calls (int): Number of allowed calls for books
+
+    Returns:
+        None
+    """
+    logger.info('----- Start getting books lists from NYT API -----')
+
+    api_calls_at_start = session.api_calls
+    retrieved_documents = 0
+
+    for position, list_name in enumerate(BOOKS_LISTS):
+        # Calls left unused by a list go to the next ones
+        remaining_calls = max_books_calls - (session.api_calls - api_calls_at_start)
+        max_list_calls = remaining_calls // (len(BOOKS_LISTS) - position)
+
+        try:
+            retrieved_documents += walk_books_list(session=session, pipeline=pipeline,
+                                                   list_name=list_name,
+                                                   max_api_calls=max_api_calls,
+                                                   max_list_calls=max_list_calls)
+
+        except BudgetExhaustedError as e:
+            logger.warning(f"-----Error:{e}-----")
+            break
+
+    session.planner.record(target='books', calls=session.api_calls - api_calls_at_start,
+                           documents=retrieved_documents)
+    pipeline.flush()
+
+
+def walk_books_list(session: Session, pipeline: Pipeline, list_name: str,
+                    max_api_calls: int, max_list_calls: int) -> int:
+    """Walk the publication dates of a best-sellers list
+
+        Dates are walked from the current list to the past, following
+        previous_published_date of each response:
+        - first, down to the newest date retrieved by previous runs, so
+          that weeks published since then are retrieved
+        - then, from the oldest date retrieved by previous runs, to
+          backfill the list history until its first publication.
+        The newest date is saved once the first walk is done and the
+        backfill date after each saved week.
+
+    Args:
+        session (Session): Used ETL session
+        pipeline (Pipeline): Pipeline where retrieved documents are submitted
+        list_name (str): Encoded list name, full-overview for all lists
+        max_api_calls (int): Maximum of dailly calls allowed by the NYT API
+        max_list_calls (int): Number of allowed calls for the list
+
+    Returns:
+        int: Number of retrieved books documents
+
+    Raises:
+        BudgetExhaustedError: If the daily NYT API budget is exhausted
+    """
+    checkpoint_name = f'books_lists/{list_name}'
+    checkpoint = session.checkpoints.get(checkpoint_name)
+    newest_date = checkpoint.get('newest_published_date')
+    backfill_date = checkpoint.get('backfill_date')
+    committer = CheckpointCommitter(store=session.checkpoints, endpoint=checkpoint_name)
+
+    api_calls_at_start = session.api_calls
+    retrieved_documents = 0
+    published_date = ''  # Current list
+    walk_newest_date = None
+    is_backfilling = False
+
+    while ((session.is_remaining_api_calls(max_api_calls=max_api_calls))
+           and (session.api_calls - api_calls_at_start < max_list_calls)):
+
+        endpoint, params = build_query(index_name='books_lists', list_name=list_name,
+                                       published_date=published_date)
+
+        try:
+            content = session.client.get(endpoint=endpoint, params=params)
+            session.archive.append(index_name='books_lists', endpoint=endpoint,
+                                   request_key=f"{list_name}/{published_date or 'current'}",
+                                   content=content.content)
+            week = content.json()['results']
+            week_date = week['published_date']
+
+        except BudgetExhaustedError:
+            raise
+
+        except Exception as e:
+            logger.warning(f"-----Error:{e}-----")
+            committer.fail()
+            break
+
+        previous_date = week.get('previous_published_date') or ''
+        state = {}
+
+        if is_backfilling:
+            state['backfill_date'] = previous_date
+
+        elif newest_date is None:  # First run: the current list starts the backfill
+            state = {'newest_published_date': week_date, 'backfill_date': previous_date}
+            is_backfilling = True
+
+        else:
+            walk_newest_date = walk_newest_date or week_date
+
+            if week_date <= newest_date or not previous_date:  # Weeks published since last run retrieved
+                state['newest_published_date'] = walk_newest_date
+                previous_date = backfill_date
+                is_backfilling = True
 
-        ######################################################
-        time.sleep(12)  ##### TO MODIFY ACCORDING API ALLOWANCE
-        ######################################################
+        logger.info(f'----- Books lists {list_name} of {week_date} retrieved -----')
+
+        try:
+            retrieved_documents += submit_ranked_books(session=session, pipeline=pipeline,
+                                                       week=week, on_loaded=committer.track(**state))
+
+        except Exception as e:  # Malformed week or books index unavailable, the list stops here
+            logger.warning(f"-----Error:{e}-----")
+            committer.fail()
+            break
+
+        if is_backfilling and not previous_date:
+            logger.info(f'----- No more {list_name} books lists to retrieve from NYT API -----')
+            break
+
+        published_date = previous_date
+
+    return retrieved_documents
+
+
+def submit_ranked_books(session: Session, pipeline: Pipeline, week: Dict[str, Any],
+                        on_loaded: Optional[Callable[[bool], None]] = None) -> int:
+    """Submit books of best-sellers lists of a week to the pipeline
+
+        Books already stored by best-sellers history are looked up by
+        ISBN13 so that their ranks are merged in their ranks_history.
+
+    Args:
+        session (Session): Used ETL session
+        pipeline (Pipeline): Pipeline where books are submitted
+        week (dict): Results of full-overview or of a dated list response
+        on_loaded (callable): Called with the load result of the books
+
+    Returns:
+        int: Number of submitted books documents
+    """
+    books = lists_to_books(week=week)
+    ids_by_isbn = get_books_ids_by_isbn(con=session.con, index_name='books',
+                                        isbns=[book['ranks_history'][0]['primary_isbn13']
+                                               for book in books
+                                               if book['ranks_history'][0]['primary_isbn13']])
+
+    pipeline.submit(index_name='books', docs=books, on_loaded=on_loaded,
+                    transform=partial(ranked_books_to_actions, ids_by_isbn=ids_by_isbn))
+
+    return len(books)
+
+
+def replay_archive(session: Session, pipeline: Pipeline, index_name: str) -> None:
+    """Load archived NYT API responses of an index in Elasticsearch
+
+        Responses are streamed from the archive through the pipeline
+        without any NYT API call. An archived books list week which can
+        not be submitted is logged and skipped.
+
+    Args:
+        session (Session): Used ETL session
+        pipeline (Pipeline): Pipeline where archived documents are submitted
+        index_name (str): Name of the Elasticsearch index where documents
+            are added
+
+    Returns:
+        None
+    """
+    logger.info(f'----- Start replaying archived {index_name} responses -----')
+
+    for res in session.archive.iter_responses(index_name=index_name):
+        docs = res.get('results') or []
+        pipeline.submit(index_name=index_name, docs=docs)
+
+    if index_name == 'books':
+        for res in session.archive.iter_responses(index_name='books_lists'):
+            try:
+                submit_ranked_books(session=session, pipeline=pipeline, week=res['results'])
+
+            except Exception as e:  # Malformed week or books index unavailable, the week is skipped
+                logger.warning(f"-----Error:{e}-----")
 
-    logger.info(f'----- Next offset to use on API call: {start_offset} -----')
+    logger.info(f'----- Finished replaying archived {index_name} responses -----')
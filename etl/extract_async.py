@@ -0,0 +1,124 @@
+"""Asynchronous extract module
+
+Concurrent version of extract.get_news(). Several news sections are
+requested at the same time, within the rate limiter budget, while the
+Elasticsearch bulk writes run in the pipeline loader workers.
+"""
+
+import asyncio
+import logging
+from typing import Dict
+
+from session import Session
+from extract import get_news_section_data, sort_sections_calls
+from pipeline import Pipeline
+from rate_limiter import BudgetExhaustedError
+
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(message)s')
+
+
+def get_news_async(session: Session, pipeline: Pipeline, sections_calls: Dict[str, int],
+                   max_api_calls: int, concurrency: int) -> None:
+    """Run entire process to get news data from NYT API concurrently
+
+    Args:
+        session (Session): Used ETL session
+        pipeline (Pipeline): Pipeline where retrieved documents are submitted
+        sections_calls (dict): Number of calls allowed by news section
+        max_api_calls (int): Maximum of dailly calls allowed by the NYT API
+        concurrency (int): Maximum of in-flight NYT API requests
+
+    Returns:
+        None
+    """
+    if (session.is_remaining_api_calls(max_api_calls=max_api_calls)):
+        get_news_data_async(session=session, pipeline=pipeline, sections_calls=sections_calls,
+                            max_api_calls=max_api_calls, concurrency=concurrency)
+
+
+def get_news_data_async(session: Session, pipeline: Pipeline,
+                        sections_calls: Dict[str, int], max_api_calls: int,
+                        concurrency: int) -> None:
+    """Get news documents from NYT newswire API with concurrent requests
+
+    Args:
+        session (Session): Used ETL session
+        pipeline (Pipeline): Pipeline where retrieved documents are submitted
+        sections_calls (dict): Number of calls allowed by news section
+        max_api_calls (int): Maximum of dailly calls allowed by the NYT API
+        concurrency (int): Maximum of in-flight NYT API requests
+
+    Returns:
+        None
+    """
+    logger.info('----- Start geting news data from NYT API concurrently -----')
+
+    asyncio.run(fetch_news_data(session=session, pipeline=pipeline,
+                                sections_calls=sections_calls, max_api_calls=max_api_calls,
+                                concurrency=concurrency))
+
+
+async def fetch_news_data(session: Session, pipeline: Pipeline,
+                          sections_calls: Dict[str, int], max_api_calls: int,
+                          concurrency: int) -> None:
+    """Run section fetchers until all sections are retrieved
+
+    Args:
+        session (Session): Used ETL session
+        pipeline (Pipeline): Pipeline where retrieved documents are submitted
+        sections_calls (dict): Number of calls allowed by news section
+        max_api_calls (int): Maximum of dailly calls allowed by the NYT API
+        concurrency (int): Maximum of in-flight NYT API requests
+
+    Returns:
+        None
+    """
+    sections_queue: asyncio.Queue = asyncio.Queue()
+
+    for section, max_pages in sort_sections_calls(sections_calls=sections_calls):
+        sections_queue.put_nowait((section, max_pages))
+
+    fetchers = [asyncio.create_task(fetch_sections(session=session,
+                                                   pipeline=pipeline,
+                                                   sections_queue=sections_queue,
+                                                   max_api_calls=max_api_calls))
+                for _ in range(concurrency)]
+
+    await asyncio.gather(*fetchers)
+
+
+async def fetch_sections(session: Session, pipeline: Pipeline,
+                         sections_queue: asyncio.Queue, max_api_calls: int) -> None:
+    """Fetch news sections from the queue until it is empty or the session
+        has no more available NYT API calls
+
+        Each section is paged through by get_news_section_data() in a
+        worker thread, so pages of a section are retrieved in order.
+
+    Args:
+        session (Session): Used ETL session
+        pipeline (Pipeline): Pipeline where retrieved documents are submitted
+        sections_queue (asyncio.Queue): Queue of (section, allowed calls) to
+            retrieve
+        max_api_calls (int): Maximum of dailly calls allowed by the NYT API
+
+    Returns:
+        None
+    """
+    while not sections_queue.empty():
+        if not session.is_remaining_api_calls(max_api_calls=max_api_calls):
+            break
+
+        section, max_pages = sections_queue.get_nowait()
+
+        try:
+            await asyncio.to_thread(get_news_section_data, session=session,
+                                    pipeline=pipeline, section=section,
+                                    max_api_calls=max_api_calls, max_pages=max_pages)
+
+        except BudgetExhaustedError as e:
+            logger.warning(f"-----Error:{e}-----")
+            break
@@ -0,0 +1,89 @@
+"""Fingerprint table module"""
+
+import logging
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(message)s')
+
+
+class FingerprintTable:
+    """Array backed table of documents fingerprints and ids
+
+    Fingerprints are stored as 64-bit integers in a NumPy array and ids
+    are concatenated in one buffer with their offsets, so a table takes
+    about 16 bytes plus the id length by document. Duplicate groups are
+    found by sorting the fingerprints.
+
+    Attributes:
+        _fingerprints (np.ndarray): 64-bit fingerprint of each document
+        _id_offsets (np.ndarray): End offset of each id in _id_buffer
+        _id_buffer (bytearray): UTF-8 encoded ids, one after the other
+        _size (int): Number of documents in the table
+    """
+
+    def __init__(self, capacity: int):
+        """Init method for FingerprintTable class
+
+        Args:
+            capacity (int): Initial number of documents, doubled when full
+        """
+        self._fingerprints: np.ndarray = np.empty(capacity, dtype=np.uint64)
+        self._id_offsets: np.ndarray = np.empty(capacity, dtype=np.uint64)
+        self._id_buffer: bytearray = bytearray()
+        self._size: int = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, fingerprint: str, doc_id: str) -> None:
+        """Add a document
+
+        Args:
+            fingerprint (str): Hexadecimal 64-bit content fingerprint
+            doc_id (str): Document id
+
+        Returns:
+            None
+        """
+        if self._size == len(self._fingerprints):
+            capacity = max(1, 2 * self._size)
+            self._fingerprints = np.resize(self._fingerprints, capacity)
+            self._id_offsets = np.resize(self._id_offsets, capacity)
+
+        self._id_buffer += doc_id.encode('utf-8')
+        self._fingerprints[self._size] = int(fingerprint, 16)
+        self._id_offsets[self._size] = len(self._id_buffer)
+        self._size += 1
+
+    def get_id(self, row: int) -> str:
+        """Get the id of the document of a row"""
+        start = int(self._id_offsets[row - 1]) if row else 0
+
+        return self._id_buffer[start:int(self._id_offsets[row])].decode('utf-8')
+
+    def iter_groups(self, min_size: int = 1) -> Iterator[Tuple[bytes, List[str]]]:
+        """Group documents by fingerprint
+
+        Args:
+            min_size (int): Minimum number of documents of returned groups,
+                2 for duplicates only
+
+        Yields:
+            tuple(bytes, list): Fingerprint and ids of its documents, in
+                adding order
+        """
+        fingerprints = self._fingerprints[:self._size]
+        order = np.argsort(fingerprints, kind='stable')
+        sorted_fingerprints = fingerprints[order]
+        bounds = np.flatnonzero(np.diff(sorted_fingerprints)) + 1
+        starts = np.concatenate(([0], bounds))
+        ends = np.concatenate((bounds, [self._size]))
+
+        for start, end in zip(starts, ends):
+            if end - start >= min_size:
+                yield (int(sorted_fingerprints[start]).to_bytes(8, 'big'),
+                       [self.get_id(row=int(row)) for row in order[start:end]])
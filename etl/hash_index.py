@@ -0,0 +1,96 @@
+"""Duplicates hash index module"""
+
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(message)s')
+
+SQLITE_MAX_PARAMETERS = 500  # Hashes by lookup query, below SQLite variables limit
+
+
+class HashIndex:
+    """Persistent index of documents hashes stored in a SQLite file
+
+    The content fingerprint of each duplicated document is mapped to the
+    id of its canonical document, the copy kept by deduplication. A dedup
+    run only scans documents it ingested and finds the canonical copy of
+    known fingerprints in the hash index instead of Elasticsearch.
+
+    Attributes:
+        _path (str): Path of the SQLite file
+        _db (sqlite3.Connection): Connection to the SQLite file
+        _lock (threading.Lock): Lock shared by concurrent callers
+    """
+
+    def __init__(self, path: str):
+        """Init method for HashIndex class
+
+        Args:
+            path (str): Path of the SQLite file
+        """
+        self._path: str = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('''CREATE TABLE IF NOT EXISTS hashes (
+                                index_name TEXT NOT NULL,
+                                hash BLOB NOT NULL,
+                                doc_id TEXT NOT NULL,
+                                PRIMARY KEY (index_name, hash)
+                            ) WITHOUT ROWID''')
+        self._db.commit()
+
+    def clear(self, index_name: str) -> None:
+        """Remove all hashes of an Elasticsearch index, before a full search"""
+        with self._lock:
+            self._db.execute('DELETE FROM hashes WHERE index_name = ?', (index_name,))
+            self._db.commit()
+
+        logger.info(f'----- Hash index cleared for {index_name} -----')
+
+    def get_canonical_ids(self, index_name: str, hashes: List[bytes]) -> Dict[bytes, str]:
+        """Get the canonical document id of known hashes
+
+        Args:
+            index_name (str): Name of the Elasticsearch index
+            hashes (list): Content fingerprints of documents, as bytes
+
+        Returns:
+            dict: Canonical document id by hash, unknown hashes are missing
+        """
+        canonical_ids = {}
+
+        with self._lock:
+            for start in range(0, len(hashes), SQLITE_MAX_PARAMETERS):
+                batch = hashes[start:start + SQLITE_MAX_PARAMETERS]
+                placeholders = ', '.join('?' * len(batch))
+                rows = self._db.execute(f'SELECT hash, doc_id FROM hashes '
+                                        f'WHERE index_name = ? AND hash IN ({placeholders})',
+                                        (index_name, *batch))
+                canonical_ids.update(rows)
+
+        return canonical_ids
+
+    def save(self, index_name: str, canonical_ids: Dict[bytes, str]) -> None:
+        """Store the canonical document id of hashes
+
+        Args:
+            index_name (str): Name of the Elasticsearch index
+            canonical_ids (dict): Canonical document id by hash
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._db.executemany('INSERT OR REPLACE INTO hashes (index_name, hash, doc_id) '
+                                 'VALUES (?, ?, ?)',
+                                 ((index_name, hashval, doc_id)
+                                  for hashval, doc_id in canonical_ids.items()))
+            self._db.commit()
@@ -0,0 +1,113 @@
+"""NYT API quota ledger module"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(message)s')
+
+
+def get_utc_day() -> str:
+    """Return current UTC day as an ISO string"""
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+class QuotaLedger:
+    """Persistent ledger of NYT API calls by api key and UTC day
+
+    It is stored in a SQLite file so that reruns of the ETL on the same day
+    know how many calls were already spent. Api keys are stored hashed.
+
+    Attributes:
+        _path (str): Path of the SQLite file
+        _db (sqlite3.Connection): Connection to the SQLite file
+        _lock (threading.Lock): Lock shared by concurrent callers
+    """
+
+    def __init__(self, path: str):
+        """Init method for QuotaLedger class
+
+        Args:
+            path (str): Path of the SQLite file
+        """
+        self._path: str = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('''CREATE TABLE IF NOT EXISTS api_calls (
+                                api_key TEXT NOT NULL,
+                                day TEXT NOT NULL,
+                                calls INTEGER NOT NULL DEFAULT 0,
+                                failed INTEGER NOT NULL DEFAULT 0,
+                                throttled INTEGER NOT NULL DEFAULT 0,
+                                PRIMARY KEY (api_key, day)
+                            )''')
+        self._db.commit()
+
+    @staticmethod
+    def _hash_key(api_key: Optional[str]) -> str:
+        """Hash api key so that it is never written in clear"""
+        return hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:16]
+
+    def record(self, api_key: Optional[str], status_code: Optional[int]) -> None:
+        """Record one NYT API call
+
+        Args:
+            api_key (str): Api key used for the call
+            status_code (int): HTTP status of the response. None if the call
+                failed without response
+
+        Returns:
+            None
+        """
+        failed = int(status_code is None or status_code >= 400)
+        throttled = int(status_code == 429)
+
+        with self._lock:
+            self._db.execute('''INSERT INTO api_calls (api_key, day, calls, failed, throttled)
+                                VALUES (?, ?, 1, ?, ?)
+                                ON CONFLICT (api_key, day) DO UPDATE SET
+                                    calls = calls + 1,
+                                    failed = failed + excluded.failed,
+                                    throttled = throttled + excluded.throttled''',
+                             (self._hash_key(api_key), get_utc_day(), failed, throttled))
+            self._db.commit()
+
+    def get_usage(self, api_key: Optional[str],
+                  day: Optional[str] = None) -> Dict[str, int]:
+        """Get calls recorded for an api key on a day
+
+        Args:
+            api_key (str): Api key used for the calls
+            day (str): ISO UTC day. Defaults to current day
+
+        Returns:
+            dict: calls, failed and throttled counts
+        """
+        with self._lock:
+            row = self._db.execute('''SELECT calls, failed, throttled FROM api_calls
+                                      WHERE api_key = ? AND day = ?''',
+                                   (self._hash_key(api_key), day or get_utc_day())).fetchone()
+
+        calls, failed, throttled = row if row else (0, 0, 0)
+
+        return {'calls': calls, 'failed': failed, 'throttled': throttled}
+
+    def get_calls(self, api_key: Optional[str], day: Optional[str] = None) -> int:
+        """Get number of calls recorded for an api key on a day
+
+        Args:
+            api_key (str): Api key used for the calls
+            day (str): ISO UTC day. Defaults to current day
+
+        Returns:
+            int: Number of recorded calls
+        """
+        return self.get_usage(api_key=api_key, day=day)['calls']
@@ -1,10 +1,21 @@
 """load module"""
 
+import itertools
 import logging
-from typing import Any, Dict, List
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Tuple
 
 from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
+from elasticsearch.helpers import parallel_bulk, streaming_bulk
+
+from constants import (BULK_CHUNK_SIZE, BULK_INITIAL_BACKOFF, BULK_MAX_CHUNK_BYTES,
+                       BULK_MAX_CHUNK_SIZE, BULK_MAX_RETRIES, BULK_MAX_THREAD_COUNT,
+                       BULK_MIN_CHUNK_SIZE, BULK_TARGET_LATENCY, BULK_THREAD_COUNT,
+                       BULK_TUNING_CHUNKS)
 
 
 logger = logging.getLogger(__name__)
@@ -30,6 +41,10 @@ def create_index(con: Elasticsearch, name: str,
 
     logger.info(f'----- Start index {name} creation -----')
 
+    settings = {**settings,
+                'number_of_replicas': get_number_of_replicas(
+                    con=con, number_of_replicas=settings.get('number_of_replicas', 1))}
+
     try:
         response = con.indices.create(index=name, mappings=mapping,
                                       settings=settings)
@@ -44,6 +59,135 @@ def create_index(con: Elasticsearch, name: str,
         logger.warning(f"-----Error:{e}-----")
 
 
+def update_mapping(con: Elasticsearch, name: str,
+                   mapping: Dict[str, Dict[str, str]]) -> None:
+    """Add fields of the configuration mapping to an existing index
+
+        Fields added to the mapping after the index creation, like derived
+        fields, are not mapped dynamically with the wrong type.
+
+    Args:
+        con (Elasticsearch): Connector object used to connect to database
+        name (str): Index name
+        mapping (dict): Index mapping
+
+    Returns:
+        None
+    """
+    try:
+        con.indices.put_mapping(index=name, properties=mapping['properties'])
+
+    except Exception as e:
+        logger.warning(f"-----Error:{e}-----")
+
+
+def update_number_of_replicas(con: Elasticsearch, name: str,
+                              settings: Dict[str, int]) -> None:
+    """Set the replicas of an existing index to the replicas the cluster
+        can allocate, so that it does not stay yellow
+
+    Args:
+        con (Elasticsearch): Connector object used to connect to database
+        name (str): Index name
+        settings (dict): Index settings
+
+    Returns:
+        None
+    """
+    number_of_replicas = get_number_of_replicas(
+        con=con, number_of_replicas=settings.get('number_of_replicas', 1))
+
+    try:
+        con.indices.put_settings(index=name, settings={'number_of_replicas': number_of_replicas})
+
+    except Exception as e:
+        logger.warning(f"-----Error:{e}-----")
+
+
+def get_number_of_replicas(con: Elasticsearch, number_of_replicas: int) -> int:
+    """Limit the number of replicas to the replicas the cluster can allocate
+
+        A replica is never allocated on the node of its primary shard, so a
+        cluster allocates at most one replica less than its data nodes.
+
+    Args:
+        con (Elasticsearch): Connector object used to connect to database
+        number_of_replicas (int): Wanted number of replicas
+
+    Returns:
+        int: Number of replicas, 0 on a single-node cluster
+    """
+    try:
+        data_nodes = con.cluster.health()['number_of_data_nodes']
+
+    except Exception as e:
+        logger.warning(f"-----Error:{e}-----")
+        return number_of_replicas
+
+    return max(0, min(number_of_replicas, data_nodes - 1))
+
+
+@contextmanager
+def bulk_load_settings(con: Elasticsearch, name: str, settings: Dict[str, int],
+                       force_merge: bool = False) -> Iterator[None]:
+    """Switch off refresh and replicas of an index during a bulk load
+
+        Refresh interval is restored when leaving the context, the default
+        one if it was left switched off by a killed load, the number of
+        replicas is set from the index settings and the data nodes of the
+        cluster. The index is then refreshed, so loaded documents are
+        searchable, and optionally force merged to one segment. Pages of
+        the index must be saved before leaving the context.
+
+    Args:
+        con (Elasticsearch): Connector object used to connect to database
+        name (str): Index name
+        settings (dict): Index settings
+        force_merge (bool): If True, segments are merged after the load
+
+    Yields:
+        None
+    """
+    refresh_interval = None  # Default refresh interval
+
+    try:
+        index_settings = con.indices.get_settings(index=name)[name]['settings']['index']
+
+        # -1 is left by a killed bulk load, it would be restored for good
+        if index_settings.get('refresh_interval') != '-1':
+            refresh_interval = index_settings.get('refresh_interval')
+
+        con.indices.put_settings(index=name,
+                                 settings={'refresh_interval': '-1', 'number_of_replicas': 0})
+        logger.info(f'----- Refresh and replicas of {name} switched off for bulk load -----')
+
+    except Exception as e:
+        logger.warning(f"-----Error:{e}-----")
+
+    try:
+        yield
+
+    finally:
+        number_of_replicas = get_number_of_replicas(
+            con=con, number_of_replicas=settings.get('number_of_replicas', 1))
+
+        try:
+            con.indices.put_settings(index=name,
+                                     settings={'refresh_interval': refresh_interval,
+                                               'number_of_replicas': number_of_replicas})
+            con.indices.refresh(index=name)
+
+            if force_merge:  # Merge runs as a background task of the cluster
+                logger.info(f'----- Force merging {name} index -----')
+                con.indices.forcemerge(index=name, max_num_segments=1,
+                                       wait_for_completion=False)
+
+            logger.info(f'----- Settings of {name} restored with {number_of_replicas} replicas -----')
+
+        except Exception as e:
+            logger.warning(f"-----Error:{e}-----")
+
+
 def delete_index(name: str, con: Elasticsearch) -> None:
     """Drop an index in Elastiseacrh
 
@@ -65,32 +209,234 @@ def delete_index(name: str, con: Elasticsearch) -> None:
     logger.info(f'----- {name} index deleted -----')
 
 
-def bulk_to_elasticsearch(
-                          con: Elasticsearch,
-                          bulk_list: List[Dict[str, Dict[str, Any]]],
-                        ) -> None:
-    """ Run Elasticsearch Bulk API with results from NYT API
+def log_failed_item(item: Dict[str, Any]) -> None:
+    """Log the error of a failed bulk response item"""
+    op_type, result = next(iter(item.items()))
+    error = result.get('error')
+    reason = error.get('reason') if isinstance(error, dict) else error
 
-    Args:
-        con (Elasticsearch):
-        bult_list (list): A list of documents with index_names from NYT API results
+    logger.warning(f"----- Failed to {op_type} document {result.get('_id')} in "
+                   f"{result.get('_index')}: {result.get('status')} {reason} -----")
 
-    Returns:
-        ObjectApiREsponse : Response from Elasticsearh Bulk API call
+
+def get_item_status(item: Dict[str, Any]) -> int:
+    """Get the HTTP status of a bulk response item"""
+    _, result = next(iter(item.items()))
+
+    return result.get('status', 0)
+
+
+class BulkLoader:
+    """Parallel loader of bulk actions tuned on Elasticsearch latency
+
+    Actions are sent with parallel_bulk by windows of BULK_TUNING_CHUNKS
+    chunks by thread. Chunk size and thread count are tuned after each
+    window:
+        - actions rejected by a full Elasticsearch queue (429) halve both
+        - when actions were waiting to be sent, bulk requests slower than
+          the target latency shrink the chunk size and faster than half
+          the target latency grow it and add a thread
+
+    Rejected actions are retried with an exponential backoff before being
+    reported as failed. Saved and failed actions are counted by index.
+    A loader can be shared by several threads.
+
+    Attributes:
+        _con (Elasticsearch): Connector object used to connect to database
+        _chunk_size (int): Number of actions by bulk request
+        _thread_count (int): Number of bulk requests sent in parallel
+        _max_chunk_bytes (int): Maximum size in bytes of a bulk request
+        _target_latency (float): Seconds by bulk request
+        _counts (dict): Number of indexed and failed actions by index name
+        _lock (threading.Lock): Lock of tuned parameters and counts
     """
-    logger.info('----- Start saving documents ----')
 
-    try:
-        response = bulk(con, bulk_list)
+    def __init__(self, con: Elasticsearch, chunk_size: int = BULK_CHUNK_SIZE,
+                 thread_count: int = BULK_THREAD_COUNT,
+                 max_chunk_bytes: int = BULK_MAX_CHUNK_BYTES,
+                 target_latency: float = BULK_TARGET_LATENCY):
+        """Init method for BulkLoader class
 
-        if not response[1]:
-            saved_documents = len(bulk_list)
-            logger.info(f'----- {saved_documents} documents saved successfully  -----')
+        Args:
+            con (Elasticsearch): Connector object used to connect to database
+            chunk_size (int): Initial number of actions by bulk request
+            thread_count (int): Initial number of parallel bulk requests
+            max_chunk_bytes (int): Maximum size in bytes of a bulk request
+            target_latency (float): Seconds by bulk request
+        """
+        self._con: Elasticsearch = con
+        self._chunk_size: int = chunk_size
+        self._thread_count: int = thread_count
+        self._max_chunk_bytes: int = max_chunk_bytes
+        self._target_latency: float = target_latency
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
 
-        else:
-            logger.warning('----- Failed to save documents. -----')
+    @property
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """_counts getter, copied"""
+        with self._lock:
+            return {index_name: dict(counts) for index_name, counts in self._counts.items()}
 
-    except Exception as e:
-        logger.warning(f"-----Error:{e}-----")
+    def load(self, actions: Iterable[Dict[str, Any]]) -> Iterator[Tuple[bool, Dict[str, Any]]]:
+        """Send actions to Elasticsearch Bulk API
+
+            Actions are consumed lazily, a window ends early when actions
+            run out so its last partial chunk is sent.
+
+        Args:
+            actions (iterable): Bulk actions, possibly a generator
+
+        Yields:
+            tuple(bool, dict): Success and bulk response item of each action,
+                in actions order
+        """
+        actions = iter(actions)
+
+        for first_action in actions:
+            with self._lock:
+                chunk_size, thread_count = self._chunk_size, self._thread_count
+
+            window = itertools.islice(actions, chunk_size * thread_count * BULK_TUNING_CHUNKS - 1)
+            sent: Deque[Dict[str, Any]] = deque()  # Actions waiting for their result
+            waiting = [0.0]  # Seconds parallel_bulk waited for actions
+
+            def iter_window() -> Iterator[Dict[str, Any]]:
+                sent.append(first_action)
+                yield first_action
+
+                while True:
+                    start = time.monotonic()
+                    action = next(window, None)
+                    waiting[0] += time.monotonic() - start
+
+                    if action is None:
+                        return
+
+                    sent.append(action)
+                    yield action
+
+            batch: List[Tuple[Dict[str, Any], bool, Dict[str, Any]]] = []
+            results = rejections = 0
+            start = time.monotonic()
+
+            for ok, item in parallel_bulk(self._con, iter_window(), thread_count=thread_count,
+                                          chunk_size=chunk_size,
+                                          max_chunk_bytes=self._max_chunk_bytes,
+                                          raise_on_error=False, raise_on_exception=False):
+                batch.append((sent.popleft(), ok, item))
+                rejections += int(not ok and get_item_status(item=item) == 429)
+
+                if len(batch) >= chunk_size:  # Results are checked by chunk
+                    results += len(batch)
+                    yield from self._report(batch=batch)
+                    batch = []
+
+            results += len(batch)
+            yield from self._report(batch=batch)
+
+            self._tune(results=results, rejections=rejections,
+                       elapsed=time.monotonic() - start, waiting=waiting[0],
+                       chunk_size=chunk_size, thread_count=thread_count)
+
+    def _report(self, batch: List[Tuple[Dict[str, Any], bool, Dict[str, Any]]]
+                ) -> Iterator[Tuple[bool, Dict[str, Any]]]:
+        """Retry rejected actions of a batch, then count and yield its results
+
+        Args:
+            batch (list): Action, success and bulk response item of
+                consecutive actions
+
+        Yields:
+            tuple(bool, dict): Success and bulk response item of each action,
+                in batch order
+        """
+        results = [(ok, item) for _, ok, item in batch]
+        self._retry(actions=[action for action, _, _ in batch], results=results)
+
+        for (action, _, _), (ok, item) in zip(batch, results):
+            if not ok:
+                log_failed_item(item=item)
+
+            self._count(index_name=action.get('_index'), ok=ok)
+
+            yield ok, item
+
+    def _retry(self, actions: List[Dict[str, Any]],
+               results: List[Tuple[bool, Dict[str, Any]]]) -> None:
+        """Send again actions rejected by a full Elasticsearch queue
+
+            Rejected actions are sent together, with an exponential backoff
+            between attempts. Each attempt sends them with streaming_bulk
+            without retry, so that results come back in actions order.
+
+        Args:
+            actions (list): Sent actions
+            results (list): Success and bulk response item of each action,
+                replaced by the result of the last attempt
+
+        Returns:
+            None
+        """
+        for attempt in range(BULK_MAX_RETRIES):
+            rejected = [position for position, (ok, item) in enumerate(results)
+                        if not ok and get_item_status(item=item) == 429]
+
+            if not rejected:
+                return
+
+            time.sleep(BULK_INITIAL_BACKOFF * 2 ** attempt)
+
+            retried = streaming_bulk(self._con, [actions[position] for position in rejected],
+                                     chunk_size=self._chunk_size,
+                                     max_chunk_bytes=self._max_chunk_bytes,
+                                     raise_on_error=False, raise_on_exception=False)
+
+            for position, result in zip(rejected, retried):
+                results[position] = result
+
+    def _count(self, index_name: str, ok: bool) -> None:
+        """Count the result of one action"""
+        with self._lock:
+            counts = self._counts.setdefault(index_name, {'indexed': 0, 'failed': 0})
+            counts['indexed' if ok else 'failed'] += 1
+
+    def _tune(self, results: int, rejections: int, elapsed: float, waiting: float,
+              chunk_size: int, thread_count: int) -> None:
+        """Tune chunk size and thread count after a window
+
+        Args:
+            results (int): Number of actions of the window
+            rejections (int): Number of actions rejected by Elasticsearch
+            elapsed (float): Seconds taken by the window
+            waiting (float): Seconds the window waited for actions
+            chunk_size (int): Chunk size used by the window
+            thread_count (int): Thread count used by the window
+
+        Returns:
+            None
+        """
+        chunks = math.ceil(results / chunk_size)
+        latency = elapsed * thread_count / chunks  # Average duration of a bulk request
+
+        if rejections:
+            chunk_size = max(BULK_MIN_CHUNK_SIZE, chunk_size // 2)
+            thread_count = max(1, thread_count // 2)
+
+        elif waiting > 0.1 * elapsed:  # Actions came slower than Elasticsearch saved them
+            return
+
+        elif latency > self._target_latency:
+            chunk_size = max(BULK_MIN_CHUNK_SIZE, int(chunk_size * self._target_latency / latency))
+
+        elif latency < self._target_latency / 2:
+            chunk_size = min(BULK_MAX_CHUNK_SIZE, chunk_size * 2)
+            thread_count = min(BULK_MAX_THREAD_COUNT, thread_count + 1)
+
+        with self._lock:
+            if (chunk_size, thread_count) != (self._chunk_size, self._thread_count):
+                logger.info(f'----- Bulk tuned to {chunk_size} actions by request and '
+                            f'{thread_count} threads, {latency:.2f}s by request, '
+                            f'{rejections} rejected actions -----')
 
-    logger.info('----- Finish saving documents from bulk -----')
+            self._chunk_size, self._thread_count = chunk_size, thread_count
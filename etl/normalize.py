@@ -0,0 +1,249 @@
+"""Normalize module
+
+Mapping driven normalization of NYT API documents before indexing. A page
+of documents is processed as a columnar batch: values of each mapped field
+are gathered in one column and normalized together according to the field
+type in the index mapping, then documents are rebuilt from the columns.
+
+Columns are plain lists rather than NumPy arrays: values are strings, dates
+and nested objects parsed one by one by Python functions, which an object
+array would not vectorize, and a page holds at most 500 documents.
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from constants import CONFIGURATIONS
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(message)s')
+
+_MISSING = object()  # Field absent from a document, kept absent
+_pruned_fields: Set[str] = set()  # Pruned fields already logged
+
+# Elasticsearch date formats used in mappings and their strftime equivalent
+DATE_FORMATS = {
+    'yyyy-MM-dd': '%Y-%m-%d',
+    'yyyy-MM-dd HH:mm:ss': '%Y-%m-%d %H:%M:%S',
+}
+
+
+def normalize_documents(index_name: str,
+                        docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Normalize a page of documents with the mapping of their index
+
+        - fields missing from the mapping are pruned, each pruned field
+          is logged once
+        - strings are trimmed and empty strings become null
+        - numbers sent as strings are converted
+        - dates are written in the mapping format, ISO 8601 by default,
+          unparsable dates become null
+
+    Args:
+        index_name (str): Name of the Elasticsearch index of the documents
+        docs (list): Documents retrieved from NYT API
+
+    Returns:
+        list: Normalized documents
+    """
+    configuration = CONFIGURATIONS.get(index_name)
+
+    if configuration is None:
+        return docs
+
+    docs = [doc for doc in docs if isinstance(doc, dict)]
+
+    return normalize_records(records=docs,
+                             properties=configuration['mapping']['properties'])
+
+
+def normalize_records(records: List[Dict[str, Any]],
+                      properties: Dict[str, Any], path: str = '') -> List[Dict[str, Any]]:
+    """Normalize records column by column
+
+    Args:
+        records (list): Records sharing the same mapping properties
+        properties (dict): Mapping properties of the records
+        path (str): Path of the records in documents, empty at top level
+
+    Returns:
+        list: Normalized records, with mapped fields only
+    """
+    log_pruned_fields(records=records, properties=properties, path=path)
+
+    columns = {field: normalize_column(values=[record.get(field, _MISSING) for record in records],
+                                       field_mapping=field_mapping, path=f'{path}{field}')
+               for field, field_mapping in properties.items()}
+
+    return [{field: column[row] for field, column in columns.items()
+             if column[row] is not _MISSING}
+            for row in range(len(records))]
+
+
+def log_pruned_fields(records: List[Dict[str, Any]], properties: Dict[str, Any],
+                      path: str) -> None:
+    """Log fields of records missing from the mapping, once by field"""
+    fields = {f'{path}{field}' for record in records for field in record
+              if field not in properties}
+
+    for field in sorted(fields - _pruned_fields):
+        logger.info(f'----- Field {field} is not mapped and is not indexed -----')
+
+    _pruned_fields.update(fields)
+
+
+def normalize_column(values: List[Any], field_mapping: Dict[str, Any],
+                     path: str = '') -> List[Any]:
+    """Normalize the values of one field
+
+        Values of object and nested fields are flattened in one batch of
+        records, normalized, then regrouped by document.
+
+    Args:
+        values (list): Value of the field in each document
+        field_mapping (dict): Mapping of the field
+        path (str): Path of the field in documents
+
+    Returns:
+        list: Normalized values, in documents order
+    """
+    if 'properties' in field_mapping:
+        return normalize_objects_column(values=values, properties=field_mapping['properties'],
+                                        path=path)
+
+    normalize_value = get_value_normalizer(field_mapping=field_mapping)
+
+    return [value if value is _MISSING else normalize_scalar(value=value,
+                                                              normalize_value=normalize_value)
+            for value in values]
+
+
+def normalize_objects_column(values: List[Any], properties: Dict[str, Any],
+                             path: str = '') -> List[Any]:
+    """Normalize the values of an object or nested field
+
+    Args:
+        values (list): Object, list of objects or empty value of each document
+        properties (dict): Mapping properties of the objects
+        path (str): Path of the field in documents
+
+    Returns:
+        list: Normalized values, in documents order
+    """
+    records = []
+    positions = []  # (row, is_list) of each flattened record
+
+    for row, value in enumerate(values):
+        objects = value if isinstance(value, list) else [value]
+
+        for item in objects:
+            if isinstance(item, dict):
+                records.append(item)
+                positions.append((row, isinstance(value, list)))
+
+    normalized_records = normalize_records(records=records, properties=properties,
+                                           path=f'{path}.')
+    normalized = [value if value is _MISSING else None for value in values]
+
+    for (row, is_list), record in zip(positions, normalized_records):
+        if not is_list:
+            normalized[row] = record
+        elif normalized[row] is None:
+            normalized[row] = [record]
+        else:
+            normalized[row].append(record)
+
+    for row, value in enumerate(values):
+        if isinstance(value, list) and normalized[row] is None:
+            normalized[row] = []
+
+    return normalized
+
+
+def normalize_scalar(value: Any, normalize_value: Callable[[Any], Any]) -> Any:
+    """Normalize a value or each value of a list, dropping null items"""
+    if isinstance(value, list):
+        items = [normalize_value(item) for item in value]
+        return [item for item in items if item is not None]
+
+    return normalize_value(value)
+
+
+def get_value_normalizer(field_mapping: Dict[str, Any]) -> Callable[[Any], Any]:
+    """Get the function normalizing values of a field type
+
+    Args:
+        field_mapping (dict): Mapping of the field
+
+    Returns:
+        callable: Function normalizing one value
+    """
+    field_type = field_mapping.get('type')
+
+    if field_type == 'date':
+        date_format = DATE_FORMATS.get(field_mapping.get('format'))
+        return lambda value: normalize_date(value=value, date_format=date_format)
+
+    if field_type in ('integer', 'long', 'short'):
+        return lambda value: normalize_number(value=value, number_type=int)
+
+    if field_type in ('float', 'double'):
+        return lambda value: normalize_number(value=value, number_type=float)
+
+    return normalize_text
+
+
+def normalize_text(value: Any) -> Any:
+    """Trim a string, empty strings become null"""
+    if isinstance(value, str):
+        return value.strip() or None
+
+    return value
+
+
+def normalize_number(value: Any, number_type: type) -> Optional[Any]:
+    """Convert a number sent as a string, invalid numbers become null"""
+    if isinstance(value, str):
+        value = value.strip()
+
+        if not value:
+            return None
+
+        try:
+            return number_type(float(value))
+        except ValueError:
+            return None
+
+    return value
+
+
+def normalize_date(value: Any, date_format: Optional[str]) -> Optional[str]:
+    """Write a date in the mapping format, ISO 8601 if it has none
+
+    Args:
+        value (any): Date sent by NYT API
+        date_format (str): strftime format of the mapping, None for ISO 8601
+
+    Returns:
+        str: Formatted date, None if it is empty or can not be parsed
+    """
+    if not isinstance(value, str) or not value.strip():
+        return None
+
+    value = value.strip()
+
+    try:
+        date = datetime.fromisoformat(value)
+    except ValueError:
+        logger.warning(f'----- Unparsable date: {value} -----')
+        return None
+
+    if date_format:
+        return date.strftime(date_format)
+
+    if len(value) == len('yyyy-MM-dd'):  # Dates without time are kept without time
+        return date.date().isoformat()
+
+    return date.isoformat()
@@ -0,0 +1,377 @@
+"""Pipeline module
+
+Staged producer/consumer pipeline between extract, transform and load.
+Fetchers submit pages of NYT documents, a transform stage normalizes them
+and builds bulk actions and loader workers stream them to Elasticsearch
+with parallel bulk requests. Stages are linked
+by bounded queues so that a slow stage applies backpressure on the
+previous one instead of letting pages pile up in memory.
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+from elasticsearch import Elasticsearch
+
+from constants import PIPELINE_IDLE_FLUSH
+from load import BulkLoader
+from normalize import normalize_documents
+from transform import results_to_actions
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(message)s')
+
+_END = None  # Queue sentinel telling a worker to stop
+
+Transform = Callable[[str, List[Dict[str, Any]]], Iterator[Dict[str, Any]]]
+
+
+class Page:
+    """Page of documents travelling through the pipeline
+
+    Attributes:
+        index_name (str): Name of the Elasticsearch index where documents
+            are added
+        docs (list): Documents retrieved from NYT API
+        on_loaded (callable): Called with True once the page is saved in
+            Elasticsearch, with False if it failed
+        transform (callable): Builds bulk actions from index name and
+            documents
+        actions (list): Bulk actions built by the transform stage
+    """
+
+    def __init__(self, index_name: str, docs: List[Dict[str, Any]],
+                 on_loaded: Optional[Callable[[bool], None]] = None,
+                 transform: Transform = results_to_actions):
+        """Init method for Page class
+
+        Args:
+            index_name (str): Name of the Elasticsearch index
+            docs (list): Documents retrieved from NYT API
+            on_loaded (callable): Called with the load result of the page
+            transform (callable): Builds bulk actions of the page
+        """
+        self.index_name: str = index_name
+        self.docs: List[Dict[str, Any]] = docs
+        self.on_loaded: Optional[Callable[[bool], None]] = on_loaded
+        self.transform: Transform = transform
+        self.actions: List[Dict[str, Any]] = []
+
+    def loaded(self, is_saved: bool) -> None:
+        """Notify the producer of the page load result"""
+        if self.on_loaded is not None:
+            self.on_loaded(is_saved)
+
+
+class StageStats:
+    """Throughput counters of a pipeline stage
+
+    Attributes:
+        name (str): Stage name
+        pages (int): Number of processed pages
+        documents (int): Number of processed documents
+        failed_pages (int): Number of pages the stage failed to process
+        busy_seconds (float): Time spent processing pages
+        _lock (threading.Lock): Lock shared by the stage workers
+    """
+
+    def __init__(self, name: str):
+        """Init method for StageStats class
+
+        Args:
+            name (str): Stage name
+        """
+        self.name: str = name
+        self.pages: int = 0
+        self.documents: int = 0
+        self.failed_pages: int = 0
+        self.busy_seconds: float = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, documents: int, busy_seconds: float, failed: bool = False) -> None:
+        """Count one processed page"""
+        with self._lock:
+            self.pages += 1
+            self.documents += documents
+            self.failed_pages += int(failed)
+            self.busy_seconds += busy_seconds
+
+    def to_dict(self) -> Dict[str, float]:
+        """Return counters and throughput of the stage"""
+        throughput = self.documents / self.busy_seconds if self.busy_seconds else 0.0
+
+        return {'pages': self.pages, 'documents': self.documents,
+                'failed_pages': self.failed_pages,
+                'busy_seconds': round(self.busy_seconds, 3),
+                'documents_by_second': round(throughput, 1)}
+
+
+class Pipeline:
+    """Bounded extract -> transform -> load pipeline
+
+    Attributes:
+        _con (Elasticsearch): Connector object used to connect to database
+        _loader (BulkLoader): Bulk loader shared by loader workers
+        _transform_queue (queue.Queue): Pages waiting to be transformed
+        _load_queue (queue.Queue): Pages waiting to be saved
+        _loader_workers (int): Number of loader threads
+        _idle_flush (float): Seconds without new page before a loader sends
+            its last chunk
+        _threads (list): Running stage threads
+        _stats (dict): StageStats by stage name
+    """
+
+    def __init__(self, con: Elasticsearch, queue_size: int, loader_workers: int,
+                 idle_flush: float = PIPELINE_IDLE_FLUSH):
+        """Init method for Pipeline class
+
+        Args:
+            con (Elasticsearch): Connector object used to connect to database
+            queue_size (int): Maximum of pages waiting between two stages
+            loader_workers (int): Number of loader threads
+            idle_flush (float): Seconds without new page before a loader
+                sends its last chunk
+        """
+        self._con: Elasticsearch = con
+        self._loader: BulkLoader = BulkLoader(con=con)
+        self._transform_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._load_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._loader_workers: int = loader_workers
+        self._idle_flush: float = idle_flush
+        self._threads: List[threading.Thread] = []
+        self._stats: Dict[str, StageStats] = {name: StageStats(name=name)
+                                              for name in ('fetch', 'normalize', 'transform', 'load')}
+
+    def __enter__(self) -> 'Pipeline':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def start(self) -> None:
+        """Start transform and loader threads"""
+        logger.info('----- Starting ETL pipeline -----')
+
+        self._threads.append(threading.Thread(target=self._transform_worker,
+                                              name='transform', daemon=True))
+
+        for worker in range(self._loader_workers):
+            self._threads.append(threading.Thread(target=self._load_worker,
+                                                  name=f'load-{worker}', daemon=True))
+
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, index_name: str, docs: List[Dict[str, Any]],
+               on_loaded: Optional[Callable[[bool], None]] = None,
+               transform: Transform = results_to_actions) -> None:
+        """Submit a page of documents retrieved by a fetcher
+
+            It blocks while the transform queue is full.
+
+        Args:
+            index_name (str): Name of the Elasticsearch index where documents
+                are added
+            docs (list): Documents retrieved from NYT API
+            on_loaded (callable): Called with True once the page is saved in
+                Elasticsearch, with False if it failed
+            transform (callable): Builds bulk actions from index name and
+                documents, results_to_actions() by default
+
+        Returns:
+            None
+        """
+        # Fetch stage busy time is the time fetchers were blocked by backpressure
+        start = time.monotonic()
+        self._transform_queue.put(Page(index_name=index_name, docs=docs,
+                                       on_loaded=on_loaded, transform=transform))
+        self._stats['fetch'].add(documents=len(docs),
+                                 busy_seconds=time.monotonic() - start)
+
+    def flush(self) -> None:
+        """Wait until every submitted page went through all stages"""
+        self._transform_queue.join()
+        self._load_queue.join()
+
+    def close(self) -> None:
+        """Drain the queues, stop stage threads and log stage counters"""
+        self._transform_queue.put(_END)
+
+        for thread in self._threads:
+            thread.join()
+
+        self._threads = []
+
+        for name, stats in self.stats().items():
+            logger.info(f'----- Pipeline stage {name}: {stats} -----')
+
+        for index_name, counts in self.counts().items():
+            logger.info(f"----- {counts['indexed']} documents saved in {index_name}, "
+                        f"{counts['failed']} failed -----")
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Return counters and throughput of each stage"""
+        return {name: stats.to_dict() for name, stats in self._stats.items()}
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """Return the number of saved and failed documents by index"""
+        return self._loader.counts
+
+    def _transform_worker(self) -> None:
+        """Normalize documents of pages, build their bulk actions and pass
+            them to loaders"""
+        while True:
+            page = self._transform_queue.get()
+
+            if page is _END:
+                for _ in range(self._loader_workers):
+                    self._load_queue.put(_END)
+                self._transform_queue.task_done()
+                break
+
+            start = time.monotonic()
+
+            try:
+                page.docs = normalize_documents(index_name=page.index_name, docs=page.docs)
+                self._stats['normalize'].add(documents=len(page.docs),
+                                             busy_seconds=time.monotonic() - start)
+
+                start = time.monotonic()
+                page.actions = list(page.transform(page.index_name, page.docs))
+                self._stats['transform'].add(documents=len(page.actions),
+                                             busy_seconds=time.monotonic() - start)
+                self._load_queue.put(page)
+
+            except Exception as e:
+                logger.warning(f"-----Error:{e}-----")
+                self._stats['transform'].add(documents=0, failed=True,
+                                             busy_seconds=time.monotonic() - start)
+                page.loaded(False)
+
+            self._transform_queue.task_done()
+
+    def _load_worker(self) -> None:
+        """Stream actions of pages to Elasticsearch
+
+            Actions of consecutive pages go through one BulkLoader call,
+            which sends them by parallel chunks of count and bytes. The call
+            ends, sending its last partial chunk, once no page arrived for
+            idle_flush seconds, so pages never wait for a full chunk. A page
+            is reported loaded once a result came back for each of its
+            actions.
+
+            Actions are pulled by the bulk thread pool while results are
+            read by the worker, so pending pages are guarded by a lock.
+        """
+        is_running = True
+
+        while is_running:
+            pending: Deque[LoadingPage] = deque()
+            pending_lock = threading.Lock()
+            stop = []
+
+            def iter_actions() -> Iterator[Dict[str, Any]]:
+                while True:
+                    try:
+                        page = self._load_queue.get(timeout=self._idle_flush)
+                    except queue.Empty:
+                        return
+
+                    if page is _END:
+                        self._load_queue.task_done()
+                        stop.append(True)
+                        return
+
+                    loading_page = LoadingPage(page=page)
+
+                    with pending_lock:
+                        pending.append(loading_page)
+
+                    for action in page.actions:
+                        loading_page.sent += 1
+                        yield action
+
+                    with pending_lock:
+                        loading_page.is_sent = True
+                        self._release_pages(pending=pending)
+
+            try:
+                for ok, _ in self._loader.load(actions=iter_actions()):
+                    with pending_lock:
+                        loading_page = next(loading_page for loading_page in pending
+                                            if loading_page.acknowledged < loading_page.sent)
+                        loading_page.acknowledge(ok=ok)
+                        self._release_pages(pending=pending)
+
+            except Exception as e:
+                logger.warning(f"-----Error:{e}-----")
+
+                with pending_lock:
+                    for loading_page in pending:  # Actions without result and never sent failed
+                        actions_count = len(loading_page.page.actions)
+                        loading_page.is_sent = True
+                        loading_page.failed += actions_count - loading_page.acknowledged
+                        loading_page.sent = loading_page.acknowledged = actions_count
+
+                    self._release_pages(pending=pending)
+
+            is_running = not stop
+
+    def _release_pages(self, pending: Deque['LoadingPage']) -> None:
+        """Report pages whose actions all got a result, in load order"""
+        while pending and pending[0].is_loaded():
+            loading_page = pending.popleft()
+            is_saved = (loading_page.failed == 0
+                        and loading_page.sent == len(loading_page.page.actions))
+
+            self._stats['load'].add(documents=loading_page.acknowledged - loading_page.failed,
+                                    failed=not is_saved,
+                                    busy_seconds=time.monotonic() - loading_page.started_at)
+
+            try:
+                loading_page.page.loaded(is_saved)
+            except Exception as e:
+                logger.warning(f"-----Error:{e}-----")
+
+            self._load_queue.task_done()
+
+
+class LoadingPage:
+    """Page whose actions are being streamed to Elasticsearch
+
+    Attributes:
+        page (Page): Loaded page
+        sent (int): Number of actions passed to the bulk stream
+        acknowledged (int): Number of actions with a bulk result
+        failed (int): Number of actions which failed
+        is_sent (bool): True once all actions of the page were passed
+        started_at (float): Time the loader took the page
+    """
+
+    def __init__(self, page: Page):
+        """Init method for LoadingPage class
+
+        Args:
+            page (Page): Loaded page
+        """
+        self.page: Page = page
+        self.sent: int = 0
+        self.acknowledged: int = 0
+        self.failed: int = 0
+        self.is_sent: bool = False
+        self.started_at: float = time.monotonic()
+
+    def acknowledge(self, ok: bool) -> None:
+        """Count the bulk result of one action"""
+        self.acknowledged += 1
+        self.failed += int(not ok)
+
+    def is_loaded(self) -> bool:
+        """Check if all actions of the page got a result"""
+        return self.is_sent and self.acknowledged == self.sent
@@ -0,0 +1,143 @@
+"""Quota planner module
+
+Split the daily NYT API budget between news sections, books and movies in
+proportion to the number of new documents each of them returned by call
+during previous runs.
+"""
+
+import logging
+import math
+import random
+import threading
+from typing import Dict
+
+from checkpoint import CheckpointStore
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(message)s')
+
+
+class QuotaPlanner:
+    """Yield-aware allocator of NYT API calls
+
+    The yield of a target (a news section, books or movies) is the number
+    of new documents it returned by call. It is learned from past runs as
+    an exponentially weighted moving average and stored in the state
+    directory.
+
+    Attributes:
+        _store (CheckpointStore): Store of yield statistics by target
+        _prior_yield (float): Yield of targets never called before
+        _decay (float): Weight of the last run in the moving average
+        _lock (threading.Lock): Lock shared by concurrent fetchers
+    """
+
+    def __init__(self, store: CheckpointStore, prior_yield: float, decay: float):
+        """Init method for QuotaPlanner class
+
+        Args:
+            store (CheckpointStore): Store of yield statistics by target
+            prior_yield (float): Yield of targets never called before
+            decay (float): Weight of the last run in the moving average
+        """
+        self._store: CheckpointStore = store
+        self._prior_yield: float = prior_yield
+        self._decay: float = decay
+        self._lock = threading.Lock()
+
+    def get_yield(self, target: str) -> float:
+        """Get the expected number of new documents by call of a target
+
+        Args:
+            target (str): Target name
+
+        Returns:
+            float: Learned yield, prior yield if the target was never called
+        """
+        return self._store.get(target).get('yield', self._prior_yield)
+
+    def record(self, target: str, calls: int, documents: int) -> None:
+        """Update the yield of a target with the result of a run
+
+        Args:
+            target (str): Target name
+            calls (int): Number of NYT API calls spent on the target
+            documents (int): Number of new documents retrieved
+
+        Returns:
+            None
+        """
+        if calls == 0:
+            return
+
+        with self._lock:
+            stats = self._store.get(target)
+            run_yield = documents / calls
+
+            if 'yield' in stats:
+                run_yield = self._decay * run_yield + (1 - self._decay) * stats['yield']
+
+            self._store.save(target, calls=stats.get('calls', 0) + calls,
+                             documents=stats.get('documents', 0) + documents,
+                             **{'yield': round(run_yield, 3)})
+
+        logger.info(f'----- {target} yield: {run_yield:.1f} documents by call -----')
+
+    def allocate(self, caps: Dict[str, int], budget: int,
+                 exploration_floor: float) -> Dict[str, int]:
+        """Split a budget of NYT API calls between targets
+
+            Each target gets a share of the budget proportional to its
+            yield, without exceeding its cap. Calls a capped target can not
+            use are given back to the others. Yields lower than the
+            exploration floor are raised to it, so that targets which
+            returned nothing recently are still called from time to time.
+            Fractional shares are rounded by largest remainder, so the
+            calls given never exceed the budget. Equal remainders are
+            ordered at random.
+
+        Args:
+            caps (dict): Maximum of calls by target
+            budget (int): Number of calls to split
+            exploration_floor (float): Lowest yield used for a target
+
+        Returns:
+            dict: Number of calls by target
+        """
+        weights = {target: max(self.get_yield(target), exploration_floor)
+                   for target in caps}
+        shares = {target: 0.0 for target in caps}
+        remaining_targets = {target for target, cap in caps.items() if cap > 0}
+        remaining_budget = float(budget)
+
+        while remaining_targets and remaining_budget > 0:
+            total_weight = sum(weights[target] for target in remaining_targets)
+
+            if total_weight == 0:  # Nothing learned and no exploration floor
+                weights.update({target: 1.0 for target in remaining_targets})
+                total_weight = len(remaining_targets)
+
+            capped_targets = {target for target in remaining_targets
+                              if remaining_budget * weights[target] / total_weight >= caps[target]}
+
+            if not capped_targets:
+                for target in remaining_targets:
+                    shares[target] = remaining_budget * weights[target] / total_weight
+                break
+
+            for target in capped_targets:
+                shares[target] = caps[target]
+                remaining_budget -= caps[target]
+
+            remaining_targets -= capped_targets
+
+        allocation = {target: math.floor(share) for target, share in shares.items()}
+        leftover_calls = math.floor(sum(shares.values()) + 1e-9) - sum(allocation.values())
+        by_remainder = sorted(shares, key=lambda target: (shares[target] - allocation[target],
+                                                          random.random()), reverse=True)
+
+        for target in by_remainder[:max(0, leftover_calls)]:
+            allocation[target] += 1
+
+        return allocation
@@ -0,0 +1,302 @@
+"""Rate limiter module"""
+
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from constants import RATE_MIN_PACE, RATE_SPEED_UP_STEP, RATE_SPEED_UP_STREAK
+from ledger import get_utc_day
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(message)s')
+
+
+class BudgetExhaustedError(Exception):
+    """Raised when no more NYT API call is allowed for the day"""
+
+
+class TokenBucket:
+    """Token bucket refilled continuously over a period
+
+    Attributes:
+        _capacity (float): Maximum amount of tokens the bucket can hold
+        _refill_rate (float): Amount of tokens added to the bucket each second
+        _tokens (float): Amount of tokens currently available
+        _updated_at (float): Monotonic time of the last refill
+    """
+
+    def __init__(self, capacity: int, period: float,
+                 tokens: Optional[float] = None):
+        """Init method for TokenBucket class
+
+        Args:
+            capacity (int): Maximum amount of tokens the bucket can hold
+            period (float): Number of seconds needed to refill an empty bucket
+            tokens (float): Amount of tokens available at start.
+                Defaults to capacity
+        """
+        self._capacity: float = float(capacity)
+        self._refill_rate: float = capacity / period
+        self._tokens: float = self._capacity if tokens is None else float(tokens)
+        self._updated_at: float = time.monotonic()
+
+    def _refill(self) -> None:
+        """Add tokens earned since last refill, up to capacity"""
+        now = time.monotonic()
+        earned = (now - self._updated_at) * self._refill_rate
+        self._tokens = min(self._capacity, self._tokens + earned)
+        self._updated_at = now
+
+    def wait_time(self) -> float:
+        """Number of seconds to wait before a token is available
+
+        Returns:
+            float: 0 if a token is available right now
+        """
+        self._refill()
+
+        if self._tokens >= 1:
+            return 0.0
+
+        return (1 - self._tokens) / self._refill_rate
+
+    def consume(self) -> None:
+        """Take one token from the bucket"""
+        self._refill()
+        self._tokens -= 1
+
+    def empty(self) -> None:
+        """Remove all available tokens from the bucket"""
+        self._refill()
+        self._tokens = min(self._tokens, 0.0)
+
+    def set_refill_rate(self, refill_rate: float) -> None:
+        """Change the amount of tokens added each second"""
+        self._refill()
+        self._refill_rate = refill_rate
+
+
+class DailyBudget:
+    """Calls allowed during a UTC day, reset at UTC midnight
+
+    Unlike a token bucket, spent calls are never given back during the
+    day, as NYT API quotas are counted by UTC day.
+
+    Attributes:
+        _capacity (int): Maximum of calls allowed by day
+        _remaining (int): Calls still allowed during _day
+        _day (str): UTC day of the remaining calls
+    """
+
+    def __init__(self, capacity: int, used: int = 0):
+        """Init method for DailyBudget class
+
+        Args:
+            capacity (int): Maximum of calls allowed by day
+            used (int): Calls already spent today
+        """
+        self._capacity: int = capacity
+        self._remaining: int = max(0, capacity - used)
+        self._day: str = get_utc_day()
+
+    @property
+    def remaining(self) -> int:
+        """_remaining getter"""
+        self._reset()
+        return self._remaining
+
+    def _reset(self) -> None:
+        """Give back the whole budget once a new UTC day started"""
+        day = get_utc_day()
+
+        if day != self._day:
+            self._day = day
+            self._remaining = self._capacity
+
+    def is_exhausted(self) -> bool:
+        """Check if no call is allowed anymore today"""
+        return self.remaining < 1
+
+    def consume(self) -> None:
+        """Spend one call of the day"""
+        self._reset()
+        self._remaining -= 1
+
+
+class RateLimiter:
+    """Shared NYT API rate limiter with per-minute and per-day budgets
+
+    Every NYT API request takes a token from the per-minute bucket and a
+    call from the daily budget. Waiting only happens when the per-minute
+    bucket is empty.
+
+    The per-minute pace adapts to throttling: it is halved each time NYT API
+    answers 429 and raised back step by step after a streak of successful
+    calls (additive increase, multiplicative decrease).
+
+    Attributes:
+        _minute_bucket (TokenBucket): Bucket holding per-minute budget
+        _day_budget (DailyBudget): Calls allowed by UTC day
+        _calls_by_minute (int): Nominal per-minute budget
+        _pace (float): Share of the nominal per-minute budget currently used
+        _success_streak (int): Successful calls since the last pace change
+        _paused_until (float): Monotonic time before which no call is allowed
+        _lock (threading.Lock): Lock shared by concurrent callers
+    """
+
+    def __init__(self, calls_by_minute: int, calls_by_day: int,
+                 used_calls_by_day: int = 0):
+        """Init method for RateLimiter class
+
+        Args:
+            calls_by_minute (int): Maximum of calls allowed by minute
+            calls_by_day (int): Maximum of calls allowed by day
+            used_calls_by_day (int): Calls already spent today, by previous runs
+        """
+        self._minute_bucket = TokenBucket(capacity=calls_by_minute, period=60)
+        self._day_budget = DailyBudget(capacity=calls_by_day, used=used_calls_by_day)
+        self._calls_by_minute: int = calls_by_minute
+        self._pace: float = 1.0
+        self._success_streak: int = 0
+        self._paused_until: float = 0.0
+        self._lock = threading.Lock()
+
+    def is_exhausted(self) -> bool:
+        """Check if the daily budget is exhausted"""
+        with self._lock:
+            return self._day_budget.is_exhausted()
+
+    def wait_time(self) -> float:
+        """Number of seconds to wait before the next call is allowed"""
+        with self._lock:
+            return self._wait_time()
+
+    def _wait_time(self) -> float:
+        """Number of seconds to wait, lock must be held by the caller"""
+        return max(self._minute_bucket.wait_time(),
+                   self._paused_until - time.monotonic(), 0.0)
+
+    def reserve(self) -> Optional[float]:
+        """Take a token now for a call allowed after the returned wait time
+
+            Tokens are taken in advance, so concurrent callers queue up
+            behind each other instead of all waking up at the same time.
+
+        Returns:
+            float: Seconds to wait before sending the call. None if the
+                daily budget is exhausted
+        """
+        with self._lock:
+            if self._day_budget.is_exhausted():
+                return None
+
+            wait_time = self._wait_time()
+            self._minute_bucket.consume()
+            self._day_budget.consume()
+
+            return wait_time
+
+    def slow_down(self, retry_after: Optional[float] = None) -> None:
+        """Halve the per-minute pace after NYT API throttled a call
+
+        Args:
+            retry_after (float): Seconds NYT API asked to wait before the
+                next call, from Retry-After header
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._pace = max(RATE_MIN_PACE, self._pace / 2)
+            self._success_streak = 0
+            self._minute_bucket.set_refill_rate(self._calls_by_minute * self._pace / 60)
+            self._minute_bucket.empty()
+
+            if retry_after:
+                self._paused_until = max(self._paused_until,
+                                         time.monotonic() + retry_after)
+
+            logger.warning(f'----- NYT API throttled, pace lowered to {self._pace:.2f} -----')
+
+    def record_success(self) -> None:
+        """Raise the per-minute pace back after a streak of successful calls"""
+        with self._lock:
+            if self._pace >= 1.0:
+                return
+
+            self._success_streak += 1
+
+            if self._success_streak >= RATE_SPEED_UP_STREAK:
+                self._pace = min(1.0, self._pace + RATE_SPEED_UP_STEP)
+                self._success_streak = 0
+                self._minute_bucket.set_refill_rate(self._calls_by_minute * self._pace / 60)
+                logger.info(f'----- NYT API pace raised to {self._pace:.2f} -----')
+
+
+class KeyPool:
+    """Pool of NYT API keys, each with its own rate limiter
+
+    Calls are scheduled on the key allowing the earliest call, so that
+    throughput grows with the number of keys.
+
+    Attributes:
+        _limiters (dict): RateLimiter by api key
+        _lock (threading.Lock): Lock shared by concurrent callers
+    """
+
+    def __init__(self, api_keys: List[str], calls_by_minute: int,
+                 calls_by_day: int, used_calls_by_day: Dict[str, int]):
+        """Init method for KeyPool class
+
+        Args:
+            api_keys (list): NYT API keys of the pool
+            calls_by_minute (int): Maximum of calls allowed by minute and key
+            calls_by_day (int): Maximum of calls allowed by day and key
+            used_calls_by_day (dict): Calls already spent today by key
+        """
+        self._limiters: Dict[str, RateLimiter] = {
+            api_key: RateLimiter(calls_by_minute=calls_by_minute,
+                                 calls_by_day=calls_by_day,
+                                 used_calls_by_day=used_calls_by_day.get(api_key, 0))
+            for api_key in api_keys
+        }
+        self._lock = threading.Lock()
+
+    @property
+    def api_keys(self) -> List[str]:
+        """Api keys of the pool"""
+        return list(self._limiters)
+
+    def get_limiter(self, api_key: str) -> RateLimiter:
+        """Get the rate limiter of an api key"""
+        return self._limiters[api_key]
+
+    def acquire(self) -> Optional[str]:
+        """Wait until a NYT API call is allowed on one of the keys
+
+        Returns:
+            str: Api key to use for the call. None if the daily budget of
+                every key is exhausted
+        """
+        with self._lock:
+            available_keys = [api_key for api_key, limiter in self._limiters.items()
+                              if not limiter.is_exhausted()]
+
+            if not available_keys:
+                logger.warning('----- Daily NYT API budget exhausted for all keys -----')
+                return None
+
+            api_key = min(available_keys,
+                          key=lambda api_key: self._limiters[api_key].wait_time())
+            wait_time = self._limiters[api_key].reserve()
+
+        if wait_time is None:
+            return None
+
+        if wait_time > 0:
+            logger.info(f'----- Waiting {wait_time:.1f} seconds for NYT API allowance -----')
+            time.sleep(wait_time)
+
+        return api_key
@@ -1,10 +1,23 @@
 import logging
 import os
-from typing import Optional
+from datetime import timedelta
+from typing import List
 
 from dotenv import load_dotenv
 from elasticsearch import Elasticsearch
 
+from constants import (MAX_API_CALLS, MAX_API_CALLS_BY_MINUTE, QUOTA_LEDGER_PATH,
+                       CHECKPOINTS_PATH, ARCHIVE_DIR, YIELD_STATS_PATH,
+                       PLANNER_PRIOR_YIELD, PLANNER_DECAY, SECTION_CATALOG_PATH,
+                       SECTION_CATALOG_TTL_DAYS, FAILED_NEWS_SECTIONS, HASH_INDEX_PATH)
+from archive import ResponseArchive
+from catalog import SectionCatalog
+from checkpoint import CheckpointStore
+from hash_index import HashIndex
+from client import NytClient
+from ledger import QuotaLedger
+from planner import QuotaPlanner
+from rate_limiter import KeyPool
 from utils import get_elasctic_connection
 
 load_dotenv()
@@ -18,17 +31,29 @@ class Session:
 
     Attributes:
         _con (Elasticsearch): Connector object used to connect to database
-        _api_key (str): Used api_key to connect to NYT APIs
-        _api_calls (int): Number of calls to NYT APIs during session
+        _api_keys (list): Used api keys to connect to NYT APIs
+        _ledger (QuotaLedger): Persistent ledger of NYT API calls by day
+        _key_pool (KeyPool): Api keys pool, with a rate limiter by key
+        _client (NytClient): Pooled HTTP client used for all NYT API calls
+        _checkpoints (CheckpointStore): Durable per-endpoint extraction state
+        _archive (ResponseArchive): Archive of raw NYT API responses
+        _planner (QuotaPlanner): Allocator of NYT API calls by yield
+        _catalog (SectionCatalog): Newswire sections kept between runs
+        _hash_index (HashIndex): Canonical document id by hash, used by
+            deduplication
     """
 
-    def __init__(self):
+    def __init__(self, calls_by_minute: int = MAX_API_CALLS_BY_MINUTE,
+                 calls_by_day: int = MAX_API_CALLS):
         """Init method for Session class
 
         Args:
             _con (Elasticsearch): Connector object used to connect to database
-            _api_key (str): Used api_key to connect to NYT APIs
-            _api_calls (int): Number of calls to NYT APIs during session
+            _api_keys (list): Used api keys to connect to NYT APIs
+            calls_by_minute (int): Maximum of NYT API calls allowed by minute
+                and api key
+            calls_by_day (int): Maximum of NYT API calls allowed by day and
+                api key
 
         """
         logger.info('----- Initiate ETL Session -----')
@@ -38,8 +63,29 @@ class Session:
         except Exception as e:
             logger.warning(f"-----Error:{e}-----")
         
-        self._api_key: Optional[str] = os.getenv("API_KEY")
-        self._api_calls: int = 0
+        self._api_keys: List[str] = get_api_keys()
+        logger.info(f'----- {len(self._api_keys)} NYT API keys in the pool -----')
+
+        self._ledger: QuotaLedger = QuotaLedger(path=QUOTA_LEDGER_PATH)
+        used_calls = {api_key: self._ledger.get_calls(api_key=api_key)
+                      for api_key in self._api_keys}
+        logger.info(f'----- {sum(used_calls.values())} NYT API calls already spent today -----')
+
+        self._key_pool: KeyPool = KeyPool(api_keys=self._api_keys,
+                                          calls_by_minute=calls_by_minute,
+                                          calls_by_day=calls_by_day,
+                                          used_calls_by_day=used_calls)
+        self._client: NytClient = NytClient(key_pool=self._key_pool,
+                                            ledger=self._ledger)
+        self._checkpoints: CheckpointStore = CheckpointStore(path=CHECKPOINTS_PATH)
+        self._archive: ResponseArchive = ResponseArchive(directory=ARCHIVE_DIR)
+        self._planner: QuotaPlanner = QuotaPlanner(store=CheckpointStore(path=YIELD_STATS_PATH),
+                                                   prior_yield=PLANNER_PRIOR_YIELD,
+                                                   decay=PLANNER_DECAY)
+        self._catalog: SectionCatalog = SectionCatalog(path=SECTION_CATALOG_PATH,
+                                                       ttl=timedelta(days=SECTION_CATALOG_TTL_DAYS),
+                                                       failed_sections=FAILED_NEWS_SECTIONS)
+        self._hash_index: HashIndex = HashIndex(path=HASH_INDEX_PATH)
 
     @property
     def con(self) -> Elasticsearch:
@@ -47,29 +93,96 @@ class Session:
         return self._con
 
     @property
-    def api_key(self) -> Optional[str]:
-        """_api_key getter"""
-        return self._api_key
+    def api_keys(self) -> List[str]:
+        """_api_keys getter"""
+        return self._api_keys
 
     @property
-    def api_calls(self) -> int:
-        """_api_calls getter"""
-        return self._api_calls
+    def ledger(self) -> QuotaLedger:
+        """_ledger getter"""
+        return self._ledger
+
+    @property
+    def key_pool(self) -> KeyPool:
+        """_key_pool getter"""
+        return self._key_pool
+
+    @property
+    def client(self) -> NytClient:
+        """_client getter"""
+        return self._client
+
+    @property
+    def checkpoints(self) -> CheckpointStore:
+        """_checkpoints getter"""
+        return self._checkpoints
+
+    @property
+    def archive(self) -> ResponseArchive:
+        """_archive getter"""
+        return self._archive
+
+    @property
+    def planner(self) -> QuotaPlanner:
+        """_planner getter"""
+        return self._planner
+
+    @property
+    def catalog(self) -> SectionCatalog:
+        """_catalog getter"""
+        return self._catalog
+
+    @property
+    def hash_index(self) -> HashIndex:
+        """_hash_index getter"""
+        return self._hash_index
 
-    @api_calls.setter
-    def api_calls(self, new_api_calls: int) -> None:
-        """_api_calls setter"""
-        self._api_calls = new_api_calls
+    @property
+    def api_calls(self) -> int:
+        """Number of calls sent to NYT APIs during session"""
+        return self._client.api_calls
 
     def is_remaining_api_calls(self, max_api_calls: int) -> bool:
-        """Check if it remains available NYT API calls in ETL session
+        """Check if it remains available NYT API calls for the day
+
+            Calls are read from the persistent ledger so that calls spent
+            by previous runs of the same UTC day are taken into account.
 
         Args:
-            api_calls (int): Consumed api_calls by the current session
             max_api_calls: Maximum of dailly calls allowed by the NYT API
+                for each api key
 
         Returns:
-            bool: True if session.api_calls < max_api_calls else False
+            bool: True if calls recorded today < max_api_calls for at least
+                one api key else False
         """
+        return any(self._ledger.get_calls(api_key=api_key) < max_api_calls
+                   for api_key in self._api_keys)
+
+    def get_remaining_api_calls(self, max_api_calls: int) -> int:
+        """Get the number of NYT API calls still available today
+
+        Args:
+            max_api_calls: Maximum of dailly calls allowed by the NYT API
+                for each api key
+
+        Returns:
+            int: Sum of remaining calls of all api keys
+        """
+        return sum(max(0, max_api_calls - self._ledger.get_calls(api_key=api_key))
+                   for api_key in self._api_keys)
+
+
+def get_api_keys() -> List[str]:
+    """Read NYT API keys from environment
+
+        API_KEYS holds a comma separated list of keys. API_KEY is used when
+        API_KEYS is not set.
+
+    Returns:
+        list: NYT API keys, without duplicates
+    """
+    api_keys = os.getenv("API_KEYS") or os.getenv("API_KEY") or ''
 
-        return True if self.api_calls < max_api_calls else False
+    return list(dict.fromkeys(api_key.strip() for api_key in api_keys.split(',')
+                              if api_key.strip()))
@@ -1,3 +1,3 @@
 #!/bin/bash
 sleep 10
-python3 /app/app.py --news True --books True --movies True &> /app/logs/etl/etl_logs_$(date -I)_.txt
+python3 /app/app.py --news True --books True --movies True --dedup True &> /app/logs/etl/etl_logs_$(date -I)_.txt
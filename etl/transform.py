@@ -1,34 +1,309 @@
 """transform module"""
 
+import hashlib
 import logging
-from typing import Any, Dict, List
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+from constants import DEDUP_KEYS, MERGE_RANKS_SCRIPT
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO,
                      format='%(asctime)s - %(message)s')
 
+# Separators between names of a byline, commas before Jr. or Sr. are kept
+AUTHORS_SEPARATOR = re.compile(r',(?!\s*(?:jr|sr)\b)\s*|\s+(?:and|&|with)\s+', re.IGNORECASE)
+BYLINE_PREFIX = re.compile(r'^by\s+', re.IGNORECASE)
+
+# Field of each index the published_year is derived from
+PUBLISHED_YEAR_FIELDS = {'news': 'first_published_date', 'movies': 'publication_date'}
+
+# Fields of each index the aggregation fields are derived from
+AGGREGATION_SOURCE_FIELDS = {
+    'news': ['byline', 'first_published_date'],
+    'books': ['author', 'ranks_history.list_name'],
+    'movies': ['byline', 'publication_date'],
+}
+
+
+def get_document_id(index_name: str, doc: Dict[str, Any]) -> Optional[str]:
+    """Build the stable Elasticsearch id of a NYT API document
+
+        news: newswire uri
+        books: primary ISBN13, hash of title and author if there is none
+        movies: review URL, hash of title and publication date if there is none
+
+    Args:
+        index_name (str): Name of the Elasticsearch index of the document
+        doc (dict): Document retrieved by NYT API
+
+    Returns:
+        str: Document id, None for unknown indexes
+    """
+    if index_name == 'news':
+        return doc.get('uri') or hash_key(doc.get('url'), doc.get('title'))
+
+    if index_name == 'books':
+        ranks = doc.get('ranks_history') or [{}]
+        isbns = doc.get('isbns') or [{}]
+        isbn = ranks[0].get('primary_isbn13') or isbns[0].get('isbn13')
+
+        return isbn or hash_key(doc.get('title'), doc.get('author'))
+
+    if index_name == 'movies':
+        url = (doc.get('link') or {}).get('url')
+
+        return url or hash_key(doc.get('display_title'), doc.get('publication_date'))
+
+    return None
+
+
+def hash_key(*values: Any) -> str:
+    """Hash values identifying a document without natural key"""
+    key = '|'.join(str(value or '').strip().lower() for value in values)
+
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def split_authors(byline: Optional[str]) -> List[str]:
+    """Split a byline in the names of its authors
+
+        "By Jane Doe, John Roe and Max Moe" gives
+        ["Jane Doe", "John Roe", "Max Moe"]. Names written all in upper
+        or lower case are title cased, so "BY JANE DOE" gives ["Jane Doe"]
+        while mixed case names like "Ian McEwan" are kept.
+
+    Args:
+        byline (str): Byline of an article or author of a book
+
+    Returns:
+        list: Authors names, without duplicates
+    """
+    if not isinstance(byline, str):
+        return []
+
+    byline = BYLINE_PREFIX.sub('', ' '.join(byline.split()))
+    authors = (normalize_author_case(author.strip(' ,'))
+               for author in AUTHORS_SEPARATOR.split(byline))
+
+    return list(dict.fromkeys(author for author in authors if author))
+
+
+def normalize_author_case(author: str) -> str:
+    """Title case a name written all in upper or lower case"""
+    if author.isupper() or author.islower():
+        return author.title()
+
+    return author
+
+
+def get_published_year(value: Optional[str]) -> Optional[int]:
+    """Get the year of a normalized date, None if there is no date"""
+    try:
+        return datetime.fromisoformat(value).year
+    except (TypeError, ValueError):
+        return None
+
 
-def results_to_list(index_name: str,
-                    results: List[Dict[str, Any]]) -> List[Dict[str, Dict[str, Any]]]:
-    """Transform a list of documents from NTY API to dict to bulk on Elasticsearch
+def add_derived_fields(index_name: str, doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Add fields computed once at ingestion for API aggregations
+
+        authors: names split from byline, or from author for books
+        published_year: year of first_published_date for news and of
+            publication_date for movies
+        list_names: names of best-sellers lists where a book is ranked
+        ingested_at: time of the transform, used by incremental
+            deduplication
+        content_fingerprint: hash of the fields identifying copies, used
+            to find duplicates with aggregations
+
+    Args:
+        index_name (str): Name of the Elasticsearch index of the document
+        doc (dict): Normalized document
+
+    Returns:
+        dict: Document with derived fields
+    """
+    doc = dict(doc)
+    doc['ingested_at'] = datetime.now(timezone.utc).isoformat()
+
+    if index_name in DEDUP_KEYS:
+        doc['content_fingerprint'] = get_content_fingerprint(doc=doc, keys=DEDUP_KEYS[index_name])
+
+    doc.update(get_aggregation_fields(index_name=index_name, doc=doc))
+
+    return doc
+
+
+def get_aggregation_fields(index_name: str, doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Compute authors, published_year and list_names of a document
+
+    Args:
+        index_name (str): Name of the Elasticsearch index of the document
+        doc (dict): Document, with at least its AGGREGATION_SOURCE_FIELDS
+
+    Returns:
+        dict: Aggregation fields of the index
+    """
+    fields = {'authors': split_authors(doc.get('author' if index_name == 'books' else 'byline'))}
+
+    if index_name in PUBLISHED_YEAR_FIELDS:
+        fields['published_year'] = get_published_year(doc.get(PUBLISHED_YEAR_FIELDS[index_name]))
+
+    if index_name == 'books':
+        list_names = (rank.get('list_name') for rank in doc.get('ranks_history') or [])
+        fields['list_names'] = list(dict.fromkeys(name for name in list_names if name))
+
+    return fields
+
+
+def get_content_fingerprint(doc: Dict[str, Any], keys: List[str]) -> str:
+    """Fingerprint the fields identifying copies of a document
+
+    Args:
+        doc (dict): Normalized document
+        keys (list): Fields identifying copies, from DEDUP_KEYS
+
+    Returns:
+        str: Hexadecimal 64-bit fingerprint
+    """
+    return hash_key(*(doc.get(key) for key in keys))[:16]  # Fits in a NumPy uint64
+
+
+def results_to_actions(index_name: str,
+                       results: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Transform documents from NTY API to actions to bulk on Elasticsearch
+
+        Each action carries the stable id of its document, so retrieving a
+        document again replaces it instead of creating a copy. Books are
+        upserted and their ranks merged in the stored ranks_history.
+        Derived fields are added to each document.
+        Actions are yielded one by one, so that they can be streamed to
+        Elasticsearch without building the whole bulk list.
 
     Args:
         index_name (str): index_name to provide to bulk data to Elasticsearch
         results (list): A list of documents retrived by NYT API
 
-    Retuns
-        bulk_list (lits): A list of index_name / documents ready to bulk on Elasticsearch
+    Yields:
+        dict: Action ready to bulk on Elasticsearch
     """
-    logger.info(f'----- Start building bulk list for {index_name} index -----')
+    for doc in results:
+        if doc is None:
+            continue
+
+        doc_id = get_document_id(index_name=index_name, doc=doc)
+        doc = add_derived_fields(index_name=index_name, doc=doc)
 
-    actions = []
+        if index_name == 'books':
+            yield build_books_upsert(index_name=index_name, doc_id=doc_id, doc=doc)
+            continue
+
+        yield {
+            "_index": index_name,
+            "_id": doc_id,
+            "_source": doc
+        }
+
+
+def build_books_upsert(index_name: str, doc_id: str,
+                       doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the update action merging ranks of a book in its stored document
+
+    Args:
+        index_name (str): Name of the books index
+        doc_id (str): Id of the book document
+        doc (dict): Book document, inserted if the book is not stored
 
+    Returns:
+        dict: Scripted upsert action
+    """
+    return {'_op_type': 'update',
+            '_index': index_name,
+            '_id': doc_id,
+            'retry_on_conflict': 3,
+            'script': {'source': MERGE_RANKS_SCRIPT,
+                       'lang': 'painless',
+                       'params': {'ranks': doc.get('ranks_history') or [],
+                                  'authors': doc.get('authors') or [],
+                                  'ingested_at': doc.get('ingested_at'),
+                                  'content_fingerprint': doc.get('content_fingerprint')}},
+            'upsert': doc}
+
+
+def lists_to_books(week: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Build books documents from best-sellers lists of a week
+
+        Documents have the shape of best-sellers history results. Each
+        book gets one ranks_history entry by list where it is ranked.
+
+    Args:
+        week (dict): Results of full-overview or of a dated list response
+
+    Returns:
+        books (list): Books documents, one by primary ISBN13
+    """
+    books = {}
+
+    for books_list in week.get('lists') or [week]:
+        for book in books_list.get('books') or []:
+            key = (book.get('primary_isbn13')
+                   or f"{book.get('title')}/{book.get('author')}")  # Some books have no ISBN
+
+            doc = books.setdefault(key, {
+                'title': book.get('title'),
+                'description': book.get('description'),
+                'contributor': book.get('contributor'),
+                'author': book.get('author'),
+                'contributor_note': book.get('contributor_note'),
+                'price': book.get('price'),
+                'age_group': book.get('age_group'),
+                'publisher': book.get('publisher'),
+                'isbns': book.get('isbns') or [],
+                'ranks_history': [],
+                'reviews': [{'book_review_link': book.get('book_review_link'),
+                             'first_chapter_link': book.get('first_chapter_link'),
+                             'sunday_review_link': book.get('sunday_review_link'),
+                             'article_chapter_link': book.get('article_chapter_link')}],
+            })
+
+            doc['ranks_history'].append({
+                'primary_isbn10': book.get('primary_isbn10'),
+                'primary_isbn13': book.get('primary_isbn13'),
+                'rank': book.get('rank'),
+                'list_name': books_list.get('list_name'),
+                'display_name': books_list.get('display_name'),
+                'published_date': week.get('published_date'),
+                'bestsellers_date': week.get('bestsellers_date'),
+                'weeks_on_list': book.get('weeks_on_list'),
+                'rank_last_week': book.get('rank_last_week'),
+                'asterisk': book.get('asterisk'),
+                'dagger': book.get('dagger'),
+            })
+
+    return list(books.values())
+
+
+def ranked_books_to_actions(index_name: str, results: List[Dict[str, Any]],
+                            ids_by_isbn: Dict[str, str]) -> Iterator[Dict[str, Any]]:
+    """Transform books built from best-sellers lists to bulk actions
+
+        Books are upserted like in results_to_actions(). Books stored with
+        random ids, before ids were stable, are found by ISBN13 and keep
+        their id.
+
+    Args:
+        index_name (str): index_name to provide to bulk data to Elasticsearch
+        results (list): Books built by lists_to_books()
+        ids_by_isbn (dict): Id of stored books documents by ISBN13
+
+    Yields:
+        dict: Update action
+    """
     for doc in results:
-        if doc is not None:
-            action = {
-                "_index": index_name,
-                "_source": doc
-            }
-        actions.append(action)
-
-    return actions
+        isbn = doc['ranks_history'][0]['primary_isbn13']
+        doc_id = ids_by_isbn.get(isbn) or get_document_id(index_name=index_name, doc=doc)
+        doc = add_derived_fields(index_name=index_name, doc=doc)
+
+        yield build_books_upsert(index_name=index_name, doc_id=doc_id, doc=doc)
@@ -1,48 +1,34 @@
 """Helpers functions"""
+import itertools
 import logging
-from typing import List, Dict, Any, Optional
-import requests
+import math
+import os
+import queue
+import threading
+from typing import List, Dict, Any, Iterator, Optional, Set, Tuple
 
-import hashlib
 from elasticsearch import Elasticsearch, helpers
 
-from constants import RESULTS_BY_PAGE
+from constants import (BULK_DELETE_CHUNK_SIZE, DEDUP_GROUP_SIZE, DEDUP_KEYS,
+                       DEDUP_PARTITION_SIZE, DEDUP_SCROLL_SIZE, FINGERPRINT_PATTERN,
+                       MGET_BATCH_SIZE, NEWS_RESULTS_BY_PAGE, RESULTS_BY_PAGE,
+                       SCAN_QUEUE_SIZE)
+from fingerprints import FingerprintTable
+from hash_index import HashIndex
+from load import BulkLoader
+from transform import AGGREGATION_SOURCE_FIELDS, get_aggregation_fields, get_content_fingerprint
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(message)s')
 
+_SLICE_END = None  # Queue sentinel telling a slice was fully read
+
 
 def get_elasctic_connection():
     """Generate elactic connector"""
 
-    return Elasticsearch(hosts="http://es-container:9200")  # To be changed if Elasticsearch will not remain locally
-
-
-def get_endpoint_hits(con: Elasticsearch, api_key: str, index_name: str) -> int:
-    """get amount of endpoint hits from NYT Api for books
-            it executes a query with offset = 0 to get amount of hits.
-            it consumes one NYT api call
-    Args:
-        con (Elasticsearch): Connector object used to connect to database
-        api_key (str): Used Api key to connect to NYT Api
-
-        index_name (str): Name of the Elasticsearch index where documents
-            are added
-    Returns:
-        endpoint_hits (int): Amount of endpoint hits returned by NTY Api
-    """
-    query = build_query(index_name=index_name, api_key=api_key, start_offset=0)
-
-    try:
-        content = requests.get(query)
-        res = content.json()
-        endpoint_hits = res['num_results']
-
-        return endpoint_hits
-
-    except Exception as e:
-        logger.warning(f"-----Error:{e}-----")
+    return Elasticsearch(hosts=os.getenv('ES_HOST', 'http://es-container:9200'))  # To be changed if Elasticsearch will not remain locally
 
 
 def get_start_offset(con: Elasticsearch, index_name: str) -> int:
@@ -78,76 +64,506 @@ def get_start_offset(con: Elasticsearch, index_name: str) -> int:
         logger.warning(f"-----Error:{e}-----")
 
 
-def build_query(index_name: str, api_key: Optional[str], start_offset: int = 0,
-                news_section: str = '') -> str:
+def build_query(index_name: str, start_offset: int = 0,
+                news_section: str = '', list_name: str = '',
+                published_date: str = '') -> Tuple[str, Dict[str, Any]]:
     """ Build query to pass to the NYT API
 
-        Query is built according to type of content we try to get data
+        Query is built according to type of content we try to get data.
+        The api key is added by the NytClient when the query is sent.
 
     Args:
         index_name (str): Specify type of the content we want to retrieve
             via NYT API. Must be news, books, movies
         start_offset (int): Specify the offset number to start retriving data.
-            Only used for books and movies
+            Only used for news, books and movies
         news_section: Name of the news section.
             Only used for news.
+        list_name (str): Encoded name of a best-sellers list, full-overview
+            for all lists. Only used for books_lists.
+        published_date (str): Publication date of best-sellers lists,
+            current lists if empty. Only used for books_lists.
 
     Return:
-        str: built query regarding passed parameters
+        tuple(str, dict): built endpoint path and query parameters
+            regarding passed parameters
     """
     logger.info('----- Start building query for NYT API -----')
 
     if index_name == 'news':
-        query = f'https://api.nytimes.com/svc/news/v3/content/all/{news_section}.json?&api-key={api_key}'
+        query = (f'news/v3/content/all/{news_section}.json',
+                 {'limit': NEWS_RESULTS_BY_PAGE, 'offset': start_offset})
         logger.info(f'----- built query for {index_name}-----')
         return query
 
     if index_name == 'news_sections':
-        query = f'https://api.nytimes.com/svc/news/v3/content/section-list.json?&api-key={api_key}'
+        query = ('news/v3/content/section-list.json', {})
         logger.info(f'----- built query for {index_name} -----')
         return query
 
     if index_name == 'books':
-        query = f'https://api.nytimes.com/svc/books/v3/lists/best-sellers/history.json?offset={start_offset}&api-key={api_key}'
+        query = ('books/v3/lists/best-sellers/history.json', {'offset': start_offset})
+        logger.info(f'----- built query {index_name} -----')
+        return query
+
+    if index_name == 'books_lists' and list_name == 'full-overview':
+        query = ('books/v3/lists/full-overview.json',
+                 {'published_date': published_date} if published_date else {})
+        logger.info(f'----- built query {index_name} -----')
+        return query
+
+    if index_name == 'books_lists':
+        query = (f"books/v3/lists/{published_date or 'current'}/{list_name}.json", {})
         logger.info(f'----- built query {index_name} -----')
         return query
 
     if index_name == 'movies':
-        query = f'https://api.nytimes.com/svc/movies/v2/reviews/all.json?offset={start_offset}&api-key={api_key}'
+        query = ('movies/v2/reviews/all.json', {'offset': start_offset})
         logger.info(f'----- built query {index_name} -----')
         return query
 
     else:
-        return " "
+        return ('', {})
+
+
+def get_books_ids_by_isbn(con: Elasticsearch, index_name: str,
+                          isbns: List[str]) -> Dict[str, str]:
+    """Find books documents already stored for a list of ISBN13
+
+    Args:
+        con (Elasticsearch): Connector object used to connect to database
+        index_name (str): Name of the books index
+        isbns (list): Primary ISBN13 of books
+
+    Returns:
+        dict: Document id by ISBN13, for ISBN13 found in the index
+    """
+    if not isbns:
+        return {}
+
+    query = {'bool': {'should': [
+        {'nested': {'path': 'isbns', 'query': {'terms': {'isbns.isbn13': isbns}}}},
+        {'nested': {'path': 'ranks_history',
+                    'query': {'terms': {'ranks_history.primary_isbn13': isbns}}}},
+    ]}}
+    wanted_isbns = set(isbns)
+    ids_by_isbn = {}
+
+    # Errors are raised: books missing from the result would be stored twice
+    res = con.search(index=index_name, query=query, size=2 * len(isbns),
+                     source=['isbns.isbn13', 'ranks_history.primary_isbn13'])
+
+    for hit in res['hits']['hits']:
+        source = hit['_source']
+        hit_isbns = ([isbn.get('isbn13') for isbn in source.get('isbns') or []]
+                     + [rank.get('primary_isbn13') for rank in source.get('ranks_history') or []])
+
+        for isbn in wanted_isbns.intersection(hit_isbns):
+            ids_by_isbn.setdefault(isbn, hit['_id'])
+
+    return ids_by_isbn
+
+
+def get_number_of_shards(con: Elasticsearch, index_name: str) -> int:
+    """Get the number of primary shards of an index, 1 if it is unknown"""
+    try:
+        res = con.indices.get_settings(index=index_name, name='index.number_of_shards')
+        return int(next(iter(res.values()))['settings']['index']['number_of_shards'])
+
+    except Exception as e:
+        logger.warning(f"-----Error:{e}-----")
+        return 1
+
+
+def parallel_scan(con: Elasticsearch, index_name: str,
+                  query: Optional[Dict[str, Any]] = None,
+                  source: Optional[List[str]] = None,
+                  size: int = DEDUP_SCROLL_SIZE,
+                  slices: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Scan documents of an index with sliced scrolls read in parallel
+
+        Each slice is scrolled by its own thread and pages of hits are
+        merged in a bounded queue, so a slow consumer applies backpressure
+        on the scrolls. Hits come in no particular order. Closing the
+        generator stops the scrolls.
+
+    Args:
+        con (Elasticsearch): Connector object used to connect to database
+        index_name (str): Name of the scanned index
+        query (dict): Query selecting scanned documents, all documents if None
+        source (list): Retrieved fields of _source, all fields if None
+        size (int): Number of hits by scroll page
+        slices (int): Number of slices, one by primary shard if None
+
+    Yields:
+        dict: Hit of a scanned document
+    """
+    if slices is None:
+        slices = get_number_of_shards(con=con, index_name=index_name)
+
+    body = {'query': query} if query else {}
+
+    if slices <= 1:
+        yield from helpers.scan(con, index=index_name, size=size, _source=source,
+                                query=body or None)
+        return
+
+    pages: queue.Queue = queue.Queue(maxsize=SCAN_QUEUE_SIZE)
+    stop = threading.Event()
+
+    def put(item: Any) -> None:
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def scan_slice(slice_id: int) -> None:
+        page = []
+
+        try:
+            for hit in helpers.scan(con, index=index_name, size=size, _source=source,
+                                    query={**body, 'slice': {'id': slice_id, 'max': slices}}):
+                page.append(hit)
+
+                if len(page) == size:
+                    put(page)
+                    page = []
+
+                if stop.is_set():
+                    return
+
+            put(page)
+
+        except Exception as e:
+            put(e)
+
+        finally:
+            put(_SLICE_END)
+
+    threads = [threading.Thread(target=scan_slice, args=(slice_id,),
+                                name=f'scan-{index_name}-{slice_id}', daemon=True)
+               for slice_id in range(slices)]
+
+    for thread in threads:
+        thread.start()
+
+    try:
+        running = slices
+
+        while running:
+            page = pages.get()
+
+            if page is _SLICE_END:
+                running -= 1
+            elif isinstance(page, Exception):
+                raise page
+            else:
+                yield from page
+
+    finally:
+        stop.set()
+
+        for thread in threads:
+            thread.join()
 
 
 # Method updated from provided one from Elasticsearch : https://www.elastic.co/fr/blog/how-to-find-and-remove-duplicate-documents-in-elasticsearch
 # by Alexander Marquardt: https://github.com/alexander-marquardt/deduplicate-elasticsearch/blob/master/deduplicate-elaticsearch.py
-def delete_duplicates(con: Elasticsearch, index_name: str) -> None:
+def delete_duplicates(con: Elasticsearch, index_name: str, refresh: bool = False,
+                      hash_index: Optional[HashIndex] = None,
+                      ingested_since: Optional[str] = None) -> bool:
     """Delete duplicates documents from a specific Elasticsearch index
 
+        Copies of a document share its content_fingerprint. Without
+        ingested_since, duplicate groups of the whole index are found by a
+        terms aggregation, so only duplicates go over the wire. Otherwise
+        only documents ingested since ingested_since are scanned, after a
+        refresh so that the last loaded documents are searchable: their
+        fingerprints are looked up in the hash index, then unknown ones in
+        Elasticsearch.
+
     Args:
         con (Elasticsearch): Connector object used to connect to database
         index_name (str): Name of the index where to check if duplicated exist
             and delete then if so
+        refresh (bool): If True, the index is refreshed once duplicates are
+            deleted
+        hash_index (HashIndex): Canonical document id by fingerprint kept
+            between runs, None to keep the oldest copy
+        ingested_since (str): ISO ingestion time of the oldest scanned
+            documents, None to search the whole index
 
     Return:
-        None
+        bool: True if duplicates were searched, False if the search failed
     """
     logger.info(f'----- Start of drop duplicates process for {index_name}  index -----')
 
-    keys_to_include_in_hash = get_index_keys(index_name=index_name)
-    dict_of_duplicate_docs = scroll_over_all_docs(
-                                                  con=con,
-                                                  index_name=index_name,
-                                                  keys_to_include_in_hash=keys_to_include_in_hash
-                                                  )
+    try:
+        if ingested_since is None:
+            logger.info(f'----- Full duplicates search in {index_name} index -----')
+            add_missing_fingerprints(con=con, index_name=index_name)
+            batches = iter([get_duplicate_groups(con=con, index_name=index_name)])
+
+            if hash_index is not None:
+                hash_index.clear(index_name=index_name)
+
+        else:
+            con.indices.refresh(index=index_name)  # Documents of the last bulk requests are scanned
+            table = scroll_over_all_docs(
+                                         con=con,
+                                         index_name=index_name,
+                                         keys_to_include_in_hash=get_index_keys(index_name=index_name),
+                                         query={'range': {'ingested_at': {'gte': ingested_since}}}
+                                         )
+
+            if table is None:  # Scan failed
+                return False
+
+            batches = iter_ingested_duplicates(con=con, index_name=index_name,
+                                               table=table, hash_index=hash_index)
+
+        for dict_of_duplicate_docs in batches:
+            if hash_index is not None and dict_of_duplicate_docs:
+                dict_of_duplicate_docs = merge_with_hash_index(con=con, index_name=index_name,
+                                                               dict_of_duplicate_docs=dict_of_duplicate_docs,
+                                                               hash_index=hash_index)
+
+            loop_over_hashes_and_remove_duplicates(con=con, index_name=index_name,
+                                                   dict_of_duplicate_docs=dict_of_duplicate_docs,
+                                                   refresh=refresh)
 
-    loop_over_hashes_and_remove_duplicates(con=con, index_name=index_name,
-                                           dict_of_duplicate_docs=dict_of_duplicate_docs)
+    except Exception as e:
+        logger.warning(f"-----Error:{e}-----")
+        return False
 
     logger.info(f'End of drop duplicates process from {index_name} -----')
 
+    return True
+
+
+def iter_ingested_duplicates(con: Elasticsearch, index_name: str, table: FingerprintTable,
+                             hash_index: Optional[HashIndex]) -> Iterator[Dict[bytes, List[str]]]:
+    """Find copies of scanned documents by batches of fingerprints
+
+        Groups of the table are consumed lazily, DEDUP_PARTITION_SIZE
+        fingerprints at a time, so only one batch of ids is held besides
+        the table. Fingerprints unknown to the hash index are searched in
+        Elasticsearch with one terms aggregation by batch.
+
+    Args:
+        con (Elasticsearch): Connector object used to connect to database
+        index_name (str): Name of the index
+        table (FingerprintTable): Fingerprints and ids of scanned documents
+        hash_index (HashIndex): Canonical document id by fingerprint, None
+            to search all fingerprints in Elasticsearch
+
+    Yields:
+        dict: Ids of documents by fingerprint of a batch
+    """
+    groups = table.iter_groups()
+
+    while True:
+        dict_of_ingested_docs = dict(itertools.islice(groups, DEDUP_PARTITION_SIZE))
+
+        if not dict_of_ingested_docs:
+            return
+
+        known_fingerprints = set()
+
+        if hash_index is not None:
+            known_fingerprints = set(hash_index.get_canonical_ids(index_name=index_name,
+                                                                  hashes=list(dict_of_ingested_docs)))
+
+        duplicate_groups = get_duplicate_groups(con=con, index_name=index_name,
+                                                fingerprints=[hashval.hex() for hashval in dict_of_ingested_docs
+                                                              if hashval not in known_fingerprints])
+
+        yield {hashval: duplicate_groups.get(hashval, array_of_ids)
+               for hashval, array_of_ids in dict_of_ingested_docs.items()}
+
+
+def get_duplicate_groups(con: Elasticsearch, index_name: str,
+                         fingerprints: Optional[List[str]] = None) -> Dict[bytes, List[str]]:
+    """Find documents sharing a content_fingerprint with a terms aggregation
+
+        Only fingerprints of at least two documents are returned. Without
+        fingerprints, the whole index is searched by partitions of the
+        terms aggregation, sized from the number of fingerprints.
+
+    Args:
+        con (Elasticsearch): Connector object used to connect to database
+        index_name (str): Name of the index
+        fingerprints (list): Hexadecimal fingerprints to search, None for
+            all fingerprints
+
+    Returns:
+        dict: Ids of documents by fingerprint, oldest ingested first
+    """
+    if fingerprints is None:
+        res = con.search(index=index_name, size=0,
+                         aggs={'fingerprints': {'cardinality': {'field': 'content_fingerprint'}}})
+        # Partitions are filled to half of their size, cardinality is approximate
+        num_partitions = max(1, math.ceil(2 * res['aggregations']['fingerprints']['value']
+                                          / DEDUP_PARTITION_SIZE))
+        includes = [{'partition': partition, 'num_partitions': num_partitions}
+                    for partition in range(num_partitions)]
+    else:
+        includes = [fingerprints[start:start + DEDUP_PARTITION_SIZE]
+                    for start in range(0, len(fingerprints), DEDUP_PARTITION_SIZE)]
+
+    duplicate_groups = {}
+
+    for include in includes:
+        res = con.search(index=index_name, size=0, aggs={
+            'duplicates': {
+                'terms': {'field': 'content_fingerprint',
+                          'include': include,
+                          'min_doc_count': 2,
+                          'size': DEDUP_PARTITION_SIZE,
+                          'shard_size': DEDUP_PARTITION_SIZE},  # Copies are spread over shards
+                'aggs': {
+                    'copies': {
+                        'top_hits': {'size': DEDUP_GROUP_SIZE,
+                                     '_source': False,
+                                     'sort': [{'ingested_at': {'order': 'asc',
+                                                               'missing': '_first',
+                                                               'unmapped_type': 'date'}}]}
+                    }
+                }
+            }
+        })
+
+        for bucket in res['aggregations']['duplicates']['buckets']:
+            if bucket['doc_count'] > DEDUP_GROUP_SIZE:
+                logger.warning(f"----- {bucket['doc_count']} copies of {bucket['key']}, "
+                               f"{DEDUP_GROUP_SIZE} handled by this run -----")
+
+            duplicate_groups[bytes.fromhex(bucket['key'])] = [hit['_id'] for hit in
+                                                              bucket['copies']['hits']['hits']]
+
+    logger.info(f'----- {len(duplicate_groups)} duplicated documents groups found in {index_name} -----')
+
+    return duplicate_groups
+
+
+def add_missing_aggregation_fields(con: Elasticsearch, index_name: str) -> bool:
+    """Add authors, published_year and list_names to documents stored
+        before they were computed at ingestion
+
+        Fields are derived like at ingestion, ingested_at is left unchanged
+        so that backfilled documents are not deduplicated as new ones.
+
+    Args:
+        con (Elasticsearch): Connector object used to connect to database
+        index_name (str): Name of the index
+
+    Returns:
+        bool: True if all documents were updated
+    """
+    query = {'bool': {'must_not': {'exists': {'field': 'authors'}}}}
+    hits = parallel_scan(con=con, index_name=index_name, query=query,
+                         source=AGGREGATION_SOURCE_FIELDS[index_name])
+    actions = ({'_op_type': 'update', '_index': index_name, '_id': hit['_id'],
+                'doc': get_aggregation_fields(index_name=index_name, doc=hit['_source'])}
+               for hit in hits)
+
+    results = [ok for ok, _ in BulkLoader(con=con).load(actions=actions)]
+    logger.info(f'----- Aggregation fields added to {sum(results)} documents of {index_name}, '
+                f'{results.count(False)} failed -----')
+
+    return all(results)
+
+
+def add_missing_fingerprints(con: Elasticsearch, index_name: str) -> int:
+    """Add content_fingerprint to documents stored before it was computed
+        at ingestion in its current format
+
+    Args:
+        con (Elasticsearch): Connector object used to connect to database
+        index_name (str): Name of the index
+
+    Returns:
+        int: Number of updated documents
+    """
+    keys = get_index_keys(index_name=index_name)
+    # Fingerprints missing or not in the 64-bit format
+    query = {'bool': {'must_not': {'regexp': {'content_fingerprint': FINGERPRINT_PATTERN}}}}
+    hits = parallel_scan(con=con, index_name=index_name, query=query, source=keys)
+    actions = ({'_op_type': 'update', '_index': index_name, '_id': hit['_id'],
+                'doc': {'content_fingerprint': get_content_fingerprint(doc=hit['_source'], keys=keys)}}
+               for hit in hits)
+
+    updated_documents = sum(ok for ok, _ in BulkLoader(con=con).load(actions=actions))
+
+    if updated_documents:
+        con.indices.refresh(index=index_name)  # Aggregations see the new fingerprints
+        logger.info(f'----- content_fingerprint added to {updated_documents} documents of {index_name} -----')
+
+    return updated_documents
+
+
+def merge_with_hash_index(con: Elasticsearch, index_name: str,
+                          dict_of_duplicate_docs: Dict[bytes, List[str]],
+                          hash_index: HashIndex) -> Dict[bytes, List[str]]:
+    """Put the canonical document of each hash first in its ids
+
+        Canonical documents come from the hash index, the first scanned
+        document becomes canonical for new hashes or when the canonical
+        document was deleted from Elasticsearch. The hash index is updated
+        with the canonical documents.
+
+    Args:
+        con (Elasticsearch): Connector object used to connect to database
+        index_name (str): Name of the index of the documents
+        dict_of_duplicate_docs (dict): Ids of scanned documents by hash
+        hash_index (HashIndex): Canonical document id by hash
+
+    Returns:
+        dict: Ids of documents by hash, canonical document first
+    """
+    canonical_ids = hash_index.get_canonical_ids(index_name=index_name,
+                                                 hashes=list(dict_of_duplicate_docs))
+    missing_ids = get_missing_ids(con=con, index_name=index_name,
+                                  ids=[doc_id for hashval, doc_id in canonical_ids.items()
+                                       if doc_id not in dict_of_duplicate_docs[hashval]])
+
+    merged = {}
+
+    for hashval, array_of_ids in dict_of_duplicate_docs.items():
+        canonical_id = canonical_ids.get(hashval)
+
+        if canonical_id is None or canonical_id in missing_ids:
+            merged[hashval] = array_of_ids
+        else:
+            merged[hashval] = [canonical_id] + [_id for _id in array_of_ids if _id != canonical_id]
+
+    hash_index.save(index_name=index_name,
+                    canonical_ids={hashval: array_of_ids[0] for hashval, array_of_ids in merged.items()})
+
+    return merged
+
+
+def get_missing_ids(con: Elasticsearch, index_name: str, ids: List[str]) -> Set[str]:
+    """Find documents ids which are not in an index anymore
+
+    Args:
+        con (Elasticsearch): Connector object used to connect to database
+        index_name (str): Name of the index
+        ids (list): Documents ids
+
+    Returns:
+        set: Ids of missing documents
+    """
+    missing_ids = set()
+
+    for start in range(0, len(ids), MGET_BATCH_SIZE):
+        res = con.mget(index=index_name, ids=ids[start:start + MGET_BATCH_SIZE], source=False)
+        missing_ids.update(doc['_id'] for doc in res['docs'] if not doc.get('found'))
+
+    return missing_ids
+
 
 def get_index_keys(index_name: str) -> List[str]:
     """Retrieve used index keys to detect duplicates
@@ -159,23 +575,19 @@ def get_index_keys(index_name: str) -> List[str]:
     Return:
         list: List of key to use to detect duplicates in the index_name
     """
-    if index_name == 'news':
-        return ['section', 'title', 'abstract', 'byline', 'source']
-
-    if index_name == 'books':
-        return ['title', 'description', 'contributor', 'contributor_note',
-                'author']
-
-    if index_name == 'movies':
-        return ['byline', 'display_title', 'mpaa_rating', 'headline']
+    return DEDUP_KEYS.get(index_name)
 
 
 # Loop over all documents in the index, and populate the
-# dict_of_duplicate_docs data structure.
+# table of fingerprints.
 def scroll_over_all_docs(con: Elasticsearch, index_name: str,
-                         keys_to_include_in_hash: List[str]) -> Dict[Any, Any]:
-    """Scroll over documents from specified index and retrieve duplicated
-        documents
+                         keys_to_include_in_hash: List[str],
+                         query: Optional[Dict[str, Any]] = None) -> Optional[FingerprintTable]:
+    """Scroll over documents from specified index and retrieve their
+        fingerprints
+
+        Only content_fingerprint and key fields are retrieved, by large
+        scroll pages of slices read in parallel.
 
     Args:
         con (Elasticsearch): Connector object used to connect to database
@@ -183,68 +595,85 @@ def scroll_over_all_docs(con: Elasticsearch, index_name: str,
             and delete then if so
         keys_to_include_in_hash (list): List of key to use to detect
             duplicates in the index_name
+        query (dict): Query selecting scanned documents, all documents if None
 
     Returns:
-        dict_of_duplicate_docs (dict): Dictionary of duplicated documents
+        FingerprintTable: Fingerprint and id of scanned documents, None if
+            the scan failed
     """
-    dict_of_duplicate_docs = {}
+    table = FingerprintTable(capacity=DEDUP_SCROLL_SIZE)
 
     try:
-        for hit in helpers.scan(con, index=index_name):
+        for hit in parallel_scan(con=con, index_name=index_name, query=query,
+                                 source=['content_fingerprint'] + keys_to_include_in_hash):
 
-            combined_key = ""
-            for mykey in keys_to_include_in_hash:
-                combined_key += str(hit['_source'][mykey])
+            # Documents stored before content_fingerprint was computed at
+            # ingestion are fingerprinted the same way
+            fingerprint = (hit['_source'].get('content_fingerprint')
+                           or get_content_fingerprint(doc=hit['_source'],
+                                                      keys=keys_to_include_in_hash))
 
-            _id = hit["_id"]
+            table.add(fingerprint=fingerprint, doc_id=hit['_id'])
 
-            hashval = hashlib.md5(combined_key.encode('utf-8')).digest()
-
-            # If the hashval is new, then we will create a new key
-            # in the dict_of_duplicate_docs, which will be
-            # assigned a value of an empty array.
-            # We then immediately push the _id onto the array.
-            # If hashval already exists, then
-            # we will just push the new _id onto the existing array
-            dict_of_duplicate_docs.setdefault(hashval, []).append(_id)
-
-        return dict_of_duplicate_docs
+        return table
 
     except Exception as e:
         logger.warning(f"-----Error:{e}-----")
 
 
 def loop_over_hashes_and_remove_duplicates(con, index_name,
-                                           dict_of_duplicate_docs) -> None:
+                                           dict_of_duplicate_docs,
+                                           refresh: bool = False) -> int:
     """Loop over duplicated documents provided and delete theme via their id
 
+        Ids of duplicates are streamed as bulk delete actions, sent by
+        large chunks in parallel.
+
     Args:
         con (Elasticsearch): Connector object used to connect to database
         index_name (str): Name of the index where to check if duplicated exist
             and delete then if so
         dict_of_duplicate_docs (dict): Dictionary of duplicated documents
+        refresh (bool): If True, the index is refreshed once all duplicates
+            are deleted
 
     Return:
-        None
+        int: Number of deleted documents
     """
+    loader = BulkLoader(con=con, chunk_size=BULK_DELETE_CHUNK_SIZE)
+    results = [ok for ok, _ in loader.load(actions=iter_delete_actions(
+                                                index_name=index_name,
+                                                dict_of_duplicate_docs=dict_of_duplicate_docs or {}))]
+    deleted_documents = sum(results)
+    failed_documents = len(results) - deleted_documents
+
+    if refresh and results:
+        try:
+            con.indices.refresh(index=index_name)
+        except Exception as e:
+            logger.warning(f"-----Error:{e}-----")
+
+    if results:
+        logger.info(f'----- {deleted_documents} deleted duplicated documents from {index_name} index, '
+                    f'{failed_documents} failed -----')
+    else:
+        logger.info('----- There is no duplicated documents -----')
 
-    # Search through the hash of doc values to see if any
-    # duplicate hashes have been found
+    return deleted_documents
 
-    deleted_documents = 0
-    for hashval, array_of_ids in dict_of_duplicate_docs.items():
-        if len(array_of_ids) > 1:
-            # Get the documents that have mapped to the current hasval
 
-            for id in array_of_ids[1:]:
-                try:
-                    con.delete(index=index_name, id=id)
-                except Exception as e:
+def iter_delete_actions(index_name: str,
+                        dict_of_duplicate_docs: Dict[Any, List[str]]) -> Iterator[Dict[str, str]]:
+    """Build bulk delete actions of duplicates, the first document of each
+        hash is kept
 
-                    logger.warning(f"-----Error:{e}-----")
-                deleted_documents += 1
+    Args:
+        index_name (str): Name of the index of the documents
+        dict_of_duplicate_docs (dict): Ids of documents by hash
 
-    if deleted_documents > 0:
-        logger.info(f'----- {deleted_documents} deleted duplicated documents from {index_name} index -----')
-    else:
-        logger.info('----- There is no duplicated documents -----')
+    Yields:
+        dict: Bulk delete action
+    """
+    for array_of_ids in dict_of_duplicate_docs.values():
+        for _id in array_of_ids[1:]:
+            yield {'_op_type': 'delete', '_index': index_name, '_id': _id}